@@ -0,0 +1,209 @@
+"""
+Schedule many rosters at once.
+
+Example:
+    python batch.py input/ --output-dir output/batch --time-limit 120 --memory-limit 2000
+    python batch.py "rosters/*.json" --processes 4 --formats csv json --constant KID_CONFLICT_FACTOR=2
+Each roster is scheduled in its own worker process, with its own time and memory limits.  Its schedules are saved in
+a folder named after the roster file, and a summary of every job is printed and saved as summary.csv.
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import time
+import scheduling
+
+ROSTER_EXTENSIONS = ('.json', '.txt', '.csv')
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def find_rosters(paths):
+    """
+    :param paths: Roster files, folders of roster files, or glob patterns
+    :return: A sorted list of roster file names
+    """
+    rosters = set()
+    for path in paths:
+        matches = [path] if os.path.exists(path) else glob.glob(path)
+        for match in matches:
+            if os.path.isdir(match):
+                rosters.update(os.path.join(match, name) for name in os.listdir(match))
+            else:
+                rosters.add(match)
+    return sorted(roster for roster in rosters if os.path.splitext(roster)[1].lower() in ROSTER_EXTENSIONS)
+
+
+def output_names(rosters):
+    """
+    :return: An output folder name for each roster: its file name without the extension, with a number added if two
+             rosters in different folders have the same file name
+    """
+    names = [os.path.splitext(os.path.basename(roster))[0] for roster in rosters]
+    counts = dict((name, names.count(name)) for name in names)
+    seen = {}
+    unique = []
+    for name in names:
+        if counts[name] > 1:
+            seen[name] = seen.get(name, 0) + 1
+            name = '{}_{}'.format(name, seen[name])
+        unique.append(name)
+    return unique
+
+
+def parse_constant(setting):
+    """
+    :param setting: A 'NAME=VALUE' string.  VALUE is read as JSON if it can be, otherwise as a string.
+    :return: (name, value)
+    """
+    name, _, value = setting.partition('=')
+    if not hasattr(scheduling.constants, name):
+        raise argparse.ArgumentTypeError("unknown constant {}".format(name))
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name, value
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+
+def run_job(job):
+    """
+    Schedule one roster in a pool worker
+    :param job: A dict of the roster file name and the run options
+    :return: A summary dict for the job
+    """
+    start = time.time()
+    summary = {'roster': job['roster'], 'events': None, 'status': 'ok', 'best_conflict': None, 'search_complete': False,
+               'nodes': None, 'seconds': None, 'peak_memory_kb': None, 'error': ''}
+
+    # Limits apply to this worker only; the pool starts a fresh worker for every job
+    if job['memory_limit']:
+        limit = job['memory_limit'] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if job['hard_time_limit']:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, job['hard_time_limit'])     # fractional seconds, unlike signal.alarm
+
+    try:
+        for name, value in job['constants']:
+            setattr(scheduling.constants, name, value)
+        events = scheduling.load_events(job['roster'])
+        summary['events'] = len(events)
+
+        schedule = scheduling.Schedule(events, num_shifts=job['num_shifts'])
+        if job['method'] == 'local':
+            best_groupings = scheduling.local_search(schedule, num_results=job['num_results'],
+                                                     iterations=job['iterations'], seed=0)
+        else:
+            stats = scheduling.SearchStats()
+            best_groupings = scheduling.minimize_conflict(schedule, num_results=job['num_results'],
+                                                          time_limit=job['time_limit'], stats=stats)
+            summary['nodes'] = stats.nodes
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+        results = best_groupings.results()
+        folder = os.path.join(job['output_dir'], job['output_name'])
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        results.save('schedule', folder, formats=job['formats'])
+        summary['best_conflict'] = results[0].total_conflict() if len(results) else None
+        summary['search_complete'] = best_groupings.search_complete
+    except JobTimeout:
+        summary['status'] = 'timed out'
+    except MemoryError:
+        summary['status'] = 'out of memory'
+    except Exception as error:
+        summary['status'] = 'error'
+        summary['error'] = '{}: {}'.format(type(error).__name__, error)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    summary['seconds'] = time.time() - start
+    summary['peak_memory_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return summary
+
+
+def run_batch(rosters, processes=None, **options):
+    """
+    :param rosters: Roster file names
+    :param processes: Number of worker processes.  Defaults to the number of CPUs.
+    :param options: Run options for every job (see the command line arguments)
+    :return: A list of job summaries, in roster order
+    """
+    jobs = [dict(options, roster=roster, output_name=name) for roster, name in zip(rosters, output_names(rosters))]
+    pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+    summaries = []
+    try:
+        for summary in pool.imap(run_job, jobs):
+            print_summary(summary)
+            summaries.append(summary)
+    except BaseException:       # a job raised or the run was interrupted: don't wait for the jobs still queued
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
+    return summaries
+
+
+SUMMARY_FIELDS = ['roster', 'events', 'status', 'best_conflict', 'search_complete', 'nodes', 'seconds', 'peak_memory_kb', 'error']
+
+
+def print_summary(summary):
+    conflict = '{:.2f}'.format(summary['best_conflict']) if summary['best_conflict'] is not None else '-'
+    print "{:<40} {:>6} events  {:<13} best {:>7}  complete {:<5}  {:.1f}s  {}".format(
+        summary['roster'], summary['events'], summary['status'], conflict, str(summary['search_complete']),
+        summary['seconds'], summary['error'])
+
+
+def save_summaries(summaries, filename):
+    with open(filename, 'wb') as outfile:
+        writer = csv.DictWriter(outfile, SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('rosters', nargs='+', help='roster files (.json, .txt or .csv), folders of them, or glob patterns')
+    parser.add_argument('--output-dir', default='output', help='each roster gets a sub-folder named after it here')
+    parser.add_argument('--processes', type=int, default=None, help='number of rosters scheduled at once (default: CPUs)')
+    parser.add_argument('--num-results', type=int, default=scheduling.constants.NUM_SCHEDULE_OPTIONS)
+    parser.add_argument('--num-shifts', type=int, default=4)
+    parser.add_argument('--method', choices=['exact', 'local'], default='exact',
+                        help='exact branch-and-bound search, or local search for very large rosters')
+    parser.add_argument('--iterations', type=int, default=None, help='local search steps (default: 5000)')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='seconds of search per roster; the best schedules found so far are saved')
+    parser.add_argument('--hard-time-limit', type=float, default=None,
+                        help='seconds after which a roster job is abandoned without output')
+    parser.add_argument('--memory-limit', type=int, default=None, help='address space limit per job, in MB')
+    parser.add_argument('--formats', nargs='+', choices=['csv', 'combined', 'json'], default=['csv'])
+    parser.add_argument('--constant', type=parse_constant, action='append', default=[], dest='constants',
+                        metavar='NAME=VALUE', help='override a setting from scheduling/constants.py')
+    args = parser.parse_args()
+
+    rosters = find_rosters(args.rosters)
+    if not rosters:
+        parser.error("no roster files found")
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    options = vars(args)
+    del options['rosters']
+    summaries = run_batch(rosters, **options)
+    summary_file = os.path.join(args.output_dir, 'summary.csv')
+    save_summaries(summaries, summary_file)
+    print "{} of {} rosters scheduled.  Summary saved to {}".format(
+        sum(1 for summary in summaries if summary['status'] == 'ok'), len(summaries), summary_file)
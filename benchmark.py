@@ -0,0 +1,152 @@
+"""
+Benchmark ConflictTable construction and the conflict search on synthetic rosters.
+
+Example:
+    python benchmark.py --sizes 20 30 40 --time-limit 30 --output benchmarks/run.json
+    python benchmark.py --sizes 20 30 40 --compare benchmarks/run.json
+Each case runs in a fresh process, so its peak memory is measured on its own.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+import numpy as np
+import scheduling
+from scheduling import conflict
+from scheduling.synthetic import synthetic_events
+
+
+def run_case(case):
+    """
+    Build the conflict table and search one synthetic roster
+    :param case: A dict of synthetic_events options plus 'time_limit'
+    :return: A dict of the case's options and measurements
+    """
+    options = dict(case)
+    time_limit = options.pop('time_limit')
+    events = synthetic_events(**options)
+
+    start = time.time()
+    table = scheduling.ConflictTable(events)
+    build_time = time.time() - start
+
+    stats = scheduling.SearchStats()
+    start = time.time()
+    search = scheduling.start_search(scheduling.Schedule(events, conflict_table=table), time_limit=time_limit, stats=stats)
+    setup_time = time.time() - start
+    first_schedule_time = None
+    for improvement in search.improvements():
+        if first_schedule_time is None:
+            first_schedule_time = time.time() - start
+    total_time = time.time() - start
+
+    # Throughput is measured over the search phase only, without the warm start and setup in start_search
+    search_time = stats.phase_times['search']
+    best_groupings = search.best_groupings
+    conflicts = sorted(-item[0] for item in best_groupings.heap)
+    result = dict(case)
+    result.update({
+        'build_time': build_time,
+        'setup_time': setup_time,
+        'search_time': search_time,
+        'nodes': stats.nodes,
+        'nodes_per_second': stats.nodes / search_time if search_time > 0 else None,
+        'time_to_first_schedule': first_schedule_time,
+        'time_to_search_complete': total_time if best_groupings.search_complete else None,
+        'search_complete': best_groupings.search_complete,
+        'best_conflict': conflicts[0] if conflicts else None,
+        'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'stats': stats.summary(),
+    })
+    return result
+
+
+def run_benchmark(sizes, repeats=1, time_limit=60, **options):
+    """
+    :param sizes: Numbers of events to benchmark
+    :param repeats: Number of differently seeded rosters per size
+    :param time_limit: Search time limit per case, in seconds
+    :param options: Passed on to synthetic_events
+    :return: A list of result dicts, one per case
+    """
+    cases = [dict(options, num_events=size, seed=seed, time_limit=time_limit) for size in sizes for seed in range(repeats)]
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)      # one fresh process per case
+    results = []
+    try:
+        for result in pool.imap(run_case, cases):
+            print_result(result)
+            results.append(result)
+    except BaseException:       # a case raised or the run was interrupted: don't wait for the cases still queued
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
+    return results
+
+
+def print_result(result, baseline=None):
+    rate = '{:.0f}'.format(result['nodes_per_second']) if result['nodes_per_second'] is not None else '-'
+    line = "{num_events:>5} events  seed {seed}  build {build_time:.3f}s  setup {setup_time:.3f}s  search {search_time:.2f}s  " \
+           "{nodes} nodes  {rate} nodes/s  best {best_conflict}  complete {search_complete}".format(rate=rate, **result)
+    if baseline is not None and result['nodes_per_second'] and baseline['nodes_per_second']:
+        line += "  ({:+.0%} nodes/s vs baseline)".format(result['nodes_per_second'] / baseline['nodes_per_second'] - 1)
+    print line
+
+
+def environment():
+    """
+    :return: A dict describing the machine and library versions, saved with the results
+    """
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': multiprocessing.cpu_count(),
+        'numpy': np.__version__,
+        'scipy': conflict.sparse is not None,
+    }
+
+
+def compare(results, baseline_file):
+    """
+    Print each result next to the matching case of a saved run
+    """
+    with open(baseline_file) as infile:
+        baseline = json.load(infile)
+    keys = ('num_events', 'seed', 'kids_per_event', 'overlap', 'hs_fraction', 'coach_reuse')
+    baseline_cases = {tuple(result[key] for key in keys): result for result in baseline['results']}
+    print "--- compared with {} ({})".format(baseline_file, baseline['environment']['date'])
+    for result in results:
+        print_result(result, baseline_cases.get(tuple(result[key] for key in keys)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 24, 32, 40])
+    parser.add_argument('--repeats', type=int, default=1, help='differently seeded rosters per size')
+    parser.add_argument('--time-limit', type=float, default=60, help='search time limit per case, in seconds')
+    parser.add_argument('--kids-per-event', type=int, default=3)
+    parser.add_argument('--overlap', type=float, default=0.5)
+    parser.add_argument('--hs-fraction', type=float, default=0.5)
+    parser.add_argument('--coach-reuse', type=float, default=0.5)
+    parser.add_argument('--output', help='JSON file to save results in')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, repeats=args.repeats, time_limit=args.time_limit,
+                            kids_per_event=args.kids_per_event, overlap=args.overlap,
+                            hs_fraction=args.hs_fraction, coach_reuse=args.coach_reuse)
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        folder = os.path.dirname(args.output)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(args.output, 'wb') as outfile:
+            json.dump({'environment': environment(), 'arguments': vars(args), 'results': results}, outfile, indent=4)
+        print "Results saved to {}".format(args.output)
@@ -10,14 +10,20 @@ filename = os.path.join(input_folder, input_file)
 output_folder = 'output'
 base_output_name = 'test'
 
+# Conflict tables are cached here between runs, keyed by the events and the custom conflict factors
+cache_folder = 'cache'
+
 # Load scioly info from file
 events = scheduling.load_events(filename)
 
 # Create a Schedule object
-sch = scheduling.Schedule(events)
+conflict_table = scheduling.ConflictTable(events, cache_dir=cache_folder)
+sch = scheduling.Schedule(events, conflict_table=conflict_table)
 
-# Attempt to minimize conflicts:
-min_conflict_schedules = scheduling.minimize_conflict(sch, num_results=scheduling.constants.NUM_SCHEDULE_OPTIONS)
+# Attempt to minimize conflicts, printing progress as the search runs:
+stats = scheduling.SearchStats(callback=scheduling.print_progress)
+min_conflict_schedules = scheduling.minimize_conflict(sch, num_results=scheduling.constants.NUM_SCHEDULE_OPTIONS, stats=stats)
+print stats.report()
 
 # Save the minimum-conflict schedules in CSV files
 print "---"
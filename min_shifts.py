@@ -0,0 +1,34 @@
+"""
+Find the fewest practice shifts that give acceptable conflict for a roster.
+
+Example:
+    python min_shifts.py input/sep21_in.txt --shifts 2 3 4 5 6 --target 0 --time-limit 60
+Every shift count is searched at once, sharing bounds between counts, and a table of shift count against best conflict
+is printed.
+"""
+import argparse
+import os
+import scheduling
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('roster', help='roster file (.json, .txt or .csv)')
+    parser.add_argument('--shifts', type=int, nargs='+', default=range(1, 9), help='shift counts to try (default: 1 to 8)')
+    parser.add_argument('--target', type=float, default=0, help='highest acceptable conflict')
+    parser.add_argument('--processes', type=int, default=None, help='number of shift counts searched at once (default: CPUs)')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds of search per shift count')
+    parser.add_argument('--output-dir', default=None, help='if given, save the best schedule for each shift count here')
+    args = parser.parse_args()
+
+    table = scheduling.ConflictTable(scheduling.load_events(args.roster))
+    rows = scheduling.minimum_shift_search(table, args.shifts, target_conflict=args.target, processes=args.processes,
+                                           time_limit=args.time_limit)
+    scheduling.print_shift_table(rows)
+
+    if args.output_dir is not None:
+        if not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+        for row in rows:
+            if row['schedule'] is not None:
+                scheduling.ScheduleResults([row['schedule']]).save('shifts{}'.format(row['shifts']), args.output_dir)
@@ -1,6 +1,17 @@
 from conflict import ConflictTable
-from file_io import load_events
-from schedule_components import Event, Shift, Schedule
+from file_io import load_events, RosterFileError
+from roster import Roster
+from schedule_components import Event, Shift, Schedule, CompactSchedule
 import constants
-from optimization import ScheduleGroup, minimize_conflict
+from optimization import ScheduleGroup, ConflictSearch, minimize_conflict, start_search, resume_search
 
+from parallel import parallel_minimize_conflict
+from local_search import local_search
+from instrumentation import SearchStats, print_progress
+from incremental import reoptimize
+from export import ScheduleResults
+from scoring import score_assignments
+from weights import Weights, weight_grid
+from sweep import sweep_weights, print_sweep
+from shift_counts import minimum_shift_search, print_shift_table
+from decomposition import decomposed_minimize_conflict
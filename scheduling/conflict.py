@@ -1,73 +1,300 @@
+import copy
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 import numpy as np
 import constants
+from roster import Roster
+from weights import Weights
+
+try:
+    import scipy.sparse as sparse
+except ImportError:     # scipy is optional; fall back to dense matrix products
+    sparse = None
+
+
+def weighted_overlap(incidence, weights, other=None):
+    """
+    :param other: Optional second incidence matrix over the same members.  Defaults to incidence.
+    :return: dense (row x other row) matrix whose [i, j] entry is the weight sum of the members shared by row i of
+             incidence and row j of other
+    """
+    if other is None:
+        other = incidence
+    if sparse is not None:
+        product = incidence.dot(sparse.diags(weights)).dot(other.T)
+        return product.toarray()
+    return (incidence * weights).dot(other.T)
+
+
+# Bump this when the cached matrices change meaning, so old cache entries are ignored
+CACHE_VERSION = 2
+
+# The numeric matrices that are saved to and loaded from the cache.  These are the unweighted components; the combined
+# scores depend on the table's Weights and are recomputed when a cached table is loaded.
+CACHED_MATRICES = ('kid_conflict_scores', 'coach_conflict_scores', 'ms_hs_pairs')
+
+
+def conflict_cache_key(roster):
+    """
+    :return: A hex digest of everything the component matrices depend on: the events, in roster order, and the custom
+             conflict factors
+    """
+    settings = {'CUSTOM_CONFLICT_FACTORS': constants.CUSTOM_CONFLICT_FACTORS}
+    events = [[event.name, event.hs, event.coach, list(event.kids)] for event in roster]
+    content = json.dumps([CACHE_VERSION, settings, events], sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def person_weights(roster):
+    """
+    :return: (kid weights, coach weights): the custom conflict factor of each of the roster's kids and coaches, in id
+             order, with 1 for people that have no custom factor
+    """
+    kid_weights = np.array([constants.CUSTOM_CONFLICT_FACTORS.get(kid, 1) for kid in roster.kid_names], dtype=float)
+    coach_weights = np.array([constants.CUSTOM_CONFLICT_FACTORS.get(coach, 1) for coach in roster.coach_names], dtype=float)
+    return kid_weights, coach_weights
+
+
+def _members(event):
+    """
+    :return: The kids and coach of an event, in a form that can be compared between rosters
+    """
+    return sorted(set(event.kids)), event.coach
 
 
 class ConflictTable(object):
     """
-    Holds matrices that record conflicts (either values or students/coaches with conflicts) between each pair of events.
+    Holds matrices that record conflict scores between each pair of events.  The students/coaches behind a conflict are
+    looked up from the roster when they are asked for.
     """
-    def __init__(self, event_array):
-        # Create nested dicts that relate event name and HS/MS status to matrix cooredinates
-        self.name_to_index = {}
-        for index, event in enumerate(event_array):
-            if event.name in self.name_to_index:
-                self.name_to_index[event.name][event.hs] = index
-            else:
-                self.name_to_index[event.name] = {event.hs: index}
-
-        self.num_events = len(event_array)
+    def __init__(self, event_array, cache_dir=None, weights=None):
+        """
+        :param event_array: A Roster, or a list of events to intern into one.  Matrix coordinates are the roster's event ids.
+        :param cache_dir: Optional folder for caching the score matrices between runs.  If a table for the same events
+               and custom conflict factors was saved there, its matrices are memory-mapped read-only instead of being rebuilt.
+        :param weights: The Weights used to combine the component matrices and to set event priorities.  Defaults to
+               the factors in the constants module.
+        """
+        self.roster = event_array if isinstance(event_array, Roster) else Roster(event_array)
+        self.weights = weights or Weights()
+        self.priority = self.roster.priorities(self.weights)      # search priority of each event
+
+        self.num_events = len(self.roster)
         matrix_dimensions = [self.num_events, self.num_events]
 
+        # The kids and coaches behind each conflict are only needed for output, so they are not stored; they are
+        # looked up in the roster's incidence data when a report asks for them (see shared_kid_ids and shared_coach_id)
+
+        self.cache_path = os.path.join(cache_dir, conflict_cache_key(self.roster)) if cache_dir is not None else None
+        if self.cache_path is not None and os.path.isdir(self.cache_path):
+            self._load_cached_matrices(self.cache_path)
+            self._combine_scores()
+            return
+
         # Create numpy matrices to hold various kinds of conflict info
-        self.common_kids = np.empty(matrix_dimensions, dtype=object)        # stores sets of kids with conflicts
-        self.common_coaches = np.empty(matrix_dimensions, dtype=object)     # Stores coaches if they have conflicts
         self.kid_conflict_scores = np.full(matrix_dimensions, 0.0)            # Stores conflict scores based on only the kid conflicts (before multiplying by KID_CONFLICT_FACTOR)
         self.coach_conflict_scores = np.full(matrix_dimensions, 0.0)          # Stores conflict scores based on only coach conflicts (before multiplying by COACH_CONFLICT_FACTOR)
         self.ms_hs_pairs = np.full(matrix_dimensions, 0.0)                    # If the event pair is corresponding B/C events, this matrix holds a 1.  Otherwise 0.
         self.conflict_scores = np.full(matrix_dimensions, 0.0)                # Stores resulting conflict scores for every pair of events
+        self.symmetric_scores = np.full(matrix_dimensions, 0.0)               # conflict_scores mirrored across the diagonal, so row i holds event i's score with every other event
+
+        self._fill_conflict_matrices(self.roster)
+        if self.cache_path is not None:
+            self._save_cached_matrices(self.cache_path)
+
+    def _load_cached_matrices(self, path):
+        """
+        Memory-map the score matrices saved in folder 'path'.  They are read-only.
+        """
+        for name in CACHED_MATRICES:
+            matrix = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+            setattr(self, name, np.asarray(matrix))     # plain ndarray view of the map; memmap slices are slow to create
 
-        self._fill_conflict_matrices(event_array)
+    def _save_cached_matrices(self, path):
+        """
+        Save the score matrices in folder 'path'.  The folder is written under a temporary name and renamed when complete,
+        so a run that is interrupted never leaves a partial cache entry behind.
+        """
+        parent = os.path.dirname(path)
+        if parent and not os.path.isdir(parent):
+            os.makedirs(parent)
+        temp_path = tempfile.mkdtemp(dir=parent)
+        try:
+            for name in CACHED_MATRICES:
+                np.save(os.path.join(temp_path, name + '.npy'), getattr(self, name))
+            os.rename(temp_path, path)
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(path):     # another run may have saved the same entry first
+                raise
 
-    def _fill_conflict_matrices(self, event_array):
+    def _fill_conflict_matrices(self, roster):
         """
-        Fill in the conflict matrices defined at initialization
-        :param event_array: Array of events that the matrices record information on
+        Fill in the conflict matrices defined at initialization.
+        The roster is encoded as sparse event x person incidence matrices (custom conflict factors become per-person weights),
+        so every pairwise score comes out of a single weighted matrix product instead of a loop over event pairs.
+        :param roster: Roster of events that the matrices record information on
         """
-        for col in range(len(event_array)):
-            for row in range(col):
-                ev1 = event_array[row]
-                ev2 = event_array[col]
+        # Only the upper triangle (row < col) of each matrix is filled in
+        upper = np.triu(np.ones([self.num_events, self.num_events], dtype=bool), 1)
+
+        # B-C pairs share an event name but differ in HS/MS status
+        same_name = roster.name_ids[:, None] == roster.name_ids[None, :]
+        pairs = upper & same_name & (roster.hs[:, None] != roster.hs[None, :])
+        self.ms_hs_pairs[pairs] = 1
 
-                # if the events are a B-C pair, register no coach/kid conflicts and record the correnspondence in the ms_hs_pairs matrix
-                if ev1.name == ev2.name and ev1.hs != ev2.hs:
-                    self.ms_hs_pairs[row, col] = 1
-                    continue
+        # B-C pairs never register kid or coach conflicts
+        scored = upper & ~pairs
 
-                # Add up conflict factors for kids
-                kids = event_array[row].get_common_kids(event_array[col])
-                if len(kids) is not 0:
-                    self.common_kids[row, col] = kids
-                    kid_cscore = 0
-                    for kid in kids:
-                        kid_cscore += constants.CUSTOM_CONFLICT_FACTORS.get(kid, 1)
-                    self.kid_conflict_scores[row, col] = kid_cscore
+        # Add up conflict factors for kids
+        kid_weights, coach_weights = person_weights(roster)
+        self.kid_conflict_scores[scored] = weighted_overlap(roster.kid_incidence, kid_weights)[scored]
 
-                # Get conflict factor for coach
-                common_coach = event_array[row].get_common_coach(event_array[col])
-                self.common_coaches[row, col] = common_coach
-                if common_coach is not None:
-                    self.coach_conflict_scores[row, col] = constants.CUSTOM_CONFLICT_FACTORS.get(common_coach, 1)
+        # Get conflict factor for coaches.  Each event has at most one coach, so comparing ids is enough.
+        rows, cols = np.nonzero(self._shared_coaches(roster, scored))
+        self.coach_conflict_scores[rows, cols] = coach_weights[roster.coach_ids[rows]]
 
-        # Generate final conflict scores by multiplying specific conflict matrices by constants and summing the results
-        self.conflict_scores = self.coach_conflict_scores*constants.COACH_CONFLICT_FACTOR \
-                               + self.kid_conflict_scores*constants.KID_CONFLICT_FACTOR \
-                               + self.ms_hs_pairs*constants.SIMULTENAITY_BONUS
+        self._combine_scores()
+
+    def _combine_scores(self):
+        """
+        Generate final conflict scores by multiplying specific conflict matrices by the table's weights and summing the results
+        """
+        self.conflict_scores = self.coach_conflict_scores*self.weights.coach_conflict_factor \
+                               + self.kid_conflict_scores*self.weights.kid_conflict_factor \
+                               + self.ms_hs_pairs*self.weights.simultaneity_bonus
+        self.symmetric_scores = self.conflict_scores + self.conflict_scores.T
+
+    def reweighted(self, weights):
+        """
+        :param weights: A Weights object
+        :return: A table for the same roster under different weights.  It shares this table's component matrices, so
+                 only the combined scores and priorities are recomputed.
+        """
+        table = copy.copy(self)
+        table.weights = weights
+        table.priority = self.roster.priorities(weights)
+        table._combine_scores()
+        return table
+
+    def subtable(self, event_ids):
+        """
+        :param event_ids: Sorted array of event ids
+        :return: A table for just these events, with the same weights.  Its roster holds copies of the events (so this
+                 table's event ids are left alone), and event i of the new table is event event_ids[i] of this one.
+                 The component matrices are sliced out of this table's, not recomputed.
+        """
+        table = copy.copy(self)
+        table.roster = Roster(copy.copy(self.roster[event_id]) for event_id in event_ids)
+        table.num_events = len(event_ids)
+        table.priority = self.priority[event_ids]
+        table.cache_path = None
+        index = np.ix_(event_ids, event_ids)
+        for name in CACHED_MATRICES:
+            setattr(table, name, getattr(self, name)[index])     # sorted ids keep each matrix upper-triangular
+        table._combine_scores()
+        return table
+
+    def updated(self, event_array):
+        """
+        Build the conflict table for an edited roster, reusing the scores between events that didn't change.
+        Only the rows and columns of new and changed events are recomputed.
+        :param event_array: The edited Roster or list of events.  Events are matched to this table's by name and B/C division.
+        :return: (table, changed) where changed is an array of the ids, in the new table's roster, of the events that
+                 are new or whose kids or coach changed
+        """
+        roster = event_array if isinstance(event_array, Roster) else Roster(event_array)
+        old_ids = np.array([self.roster.event_index.get((event.name, event.hs), -1) for event in roster], dtype=int)
+        changed = np.array([event_id for event_id, old_id in enumerate(old_ids)
+                            if old_id < 0 or _members(self.roster[old_id]) != _members(roster[event_id])], dtype=int)
+
+        table = ConflictTable.__new__(ConflictTable)
+        table.roster = roster
+        table.num_events = len(roster)
+        table.weights = self.weights
+        table.priority = roster.priorities(self.weights)
+        table.cache_path = None
+
+        # Copy the unchanged scores across.  Event ids can be in a different order, so each upper-triangle matrix is
+        # mirrored before indexing and cut back to its upper triangle afterwards.
+        kept = np.flatnonzero(old_ids >= 0)
+        for name in ('kid_conflict_scores', 'coach_conflict_scores', 'ms_hs_pairs'):
+            old_matrix = getattr(self, name)
+            matrix = np.zeros([table.num_events, table.num_events])
+            matrix[np.ix_(kept, kept)] = (old_matrix + old_matrix.T)[np.ix_(old_ids[kept], old_ids[kept])]
+            setattr(table, name, np.triu(matrix, 1))
+        table._fill_event_rows(roster, changed)
+        table._combine_scores()
+        return table, changed
+
+    def _fill_event_rows(self, roster, rows):
+        """
+        Recompute the kid, coach and B/C pair scores between each event in 'rows' and every other event
+        :param rows: Array of event ids
+        """
+        if not len(rows):
+            return
+        kids = roster.kid_incidence
+        kid_weights, coach_weights = person_weights(roster)
+        kid_scores = weighted_overlap(kids[rows], kid_weights, kids)
+
+        coach_ids = roster.coach_ids[rows][:, None]
+        shared_coach = (coach_ids == roster.coach_ids[None, :]) & (coach_ids >= 0)
+        coach_scores = np.where(shared_coach, coach_weights[coach_ids], 0)
+
+        # B-C pairs never register kid or coach conflicts, and an event doesn't conflict with itself
+        pairs = (roster.name_ids[rows][:, None] == roster.name_ids[None, :]) & (roster.hs[rows][:, None] != roster.hs[None, :])
+        unscored = pairs.copy()
+        unscored[np.arange(len(rows)), rows] = True
+        kid_scores[unscored] = 0
+        coach_scores[unscored] = 0
+
+        # Write each row into the upper triangle: entries after the event go in its row, entries before it in its column
+        columns = np.arange(self.num_events)
+        for index, row in enumerate(rows):
+            after = columns > row
+            before = columns < row
+            for matrix, values in ((self.kid_conflict_scores, kid_scores), (self.coach_conflict_scores, coach_scores),
+                                   (self.ms_hs_pairs, pairs)):
+                matrix[row, after] = values[index, after]
+                matrix[before, row] = values[index, before]
+
+    def _scored_pairs(self, roster):
+        """
+        :return: A boolean matrix that is True for the pairs (row < col) that can register kid or coach conflicts,
+                 which is every pair except B-C counterparts
+        """
+        upper = np.triu(np.ones([self.num_events, self.num_events], dtype=bool), 1)
+        same_name = roster.name_ids[:, None] == roster.name_ids[None, :]
+        return upper & ~(same_name & (roster.hs[:, None] != roster.hs[None, :]))
+
+    @staticmethod
+    def _shared_coaches(roster, scored):
+        """
+        :return: A boolean matrix that is True for the scored pairs that have the same coach
+        """
+        return scored & (roster.coach_ids[:, None] == roster.coach_ids[None, :]) & (roster.coach_ids >= 0)[:, None]
+
+    def person_overlap_counts(self):
+        """
+        :return: (kids, coaches) upper-triangle matrices holding, for each pair of events that can register conflicts,
+                 the number of kids and coaches they share.  These are the counts listed in the exported conflict summaries.
+        """
+        roster = self.roster
+        scored = self._scored_pairs(roster)
+        kids = weighted_overlap(roster.kid_incidence, np.ones(len(roster.kid_names))) * scored
+        coaches = self._shared_coaches(roster, scored).astype(float)
+        return kids, coaches
 
     def table_index(self, ev):
         """
+        :param ev: An Event or an integer event id
         :return: the matrix row/col index of event ev
         """
-        return self.name_to_index[ev.name][ev.hs]
+        return self.roster.index(ev)
 
     def get_coordinates(self, ev1, ev2):
         """
@@ -86,17 +313,41 @@ class ConflictTable(object):
         row, col = self.get_coordinates(ev1, ev2)
         return self.conflict_scores[row, col]
 
-    def get_kid_conflicts(self, ev1, ev2):
+    def shared_kid_ids(self, ev1, ev2):
         """
-        :return: The set of kids that have conflicts if ev1 and ev2 are scheduled simultaneously
+        :return: A sorted array of the ids of the kids who are in both ev1 and ev2.  It is empty for B/C counterparts,
+                 which never register conflicts.
         """
         row, col = self.get_coordinates(ev1, ev2)
-        return self.common_kids[row, col]
+        if row == col or self.ms_hs_pairs[row, col]:
+            return np.array([], dtype=int)
+        return np.intersect1d(self.roster.kid_ids[row], self.roster.kid_ids[col], assume_unique=True)
+
+    def shared_coach_id(self, ev1, ev2):
+        """
+        :return: The id of the coach of both ev1 and ev2, or None if they don't share a coach or are B/C counterparts
+        """
+        row, col = self.get_coordinates(ev1, ev2)
+        coach_id = self.roster.coach_ids[row]
+        if row == col or self.ms_hs_pairs[row, col] or coach_id < 0 or coach_id != self.roster.coach_ids[col]:
+            return None
+        return coach_id
+
+    def get_kid_conflicts(self, ev1, ev2):
+        """
+        :return: The set of kids that have conflicts if ev1 and ev2 are scheduled simultaneously, or None if there are none
+        """
+        kid_ids = self.shared_kid_ids(ev1, ev2)
+        if not len(kid_ids):
+            return None
+        return set(self.roster.kid_names[kid_id] for kid_id in kid_ids)
 
     def get_coach_conflicts(self, ev1, ev2):
         """
         :return: The coach's name if ev1 and ev2 have the same coach, otherwise None
         """
-        row, col = self.get_coordinates(ev1, ev2)
-        return self.common_coaches[row, col]
+        coach_id = self.shared_coach_id(ev1, ev2)
+        if coach_id is None:
+            return None
+        return self.roster.coach_names[coach_id]
 
@@ -0,0 +1,231 @@
+import heapq
+import numpy as np
+import constants
+from optimization import ScheduleGroup, minimize_conflict, start_search
+from schedule_components import Schedule, CompactSchedule
+from instrumentation import SearchStats
+from worker_pool import pool_map
+
+try:
+    import scipy.sparse as sparse
+    from scipy.sparse.csgraph import connected_components
+except ImportError:     # scipy is optional; fall back to a breadth-first search over the dense score matrix
+    sparse = None
+
+
+def conflict_components(conflict_table):
+    """
+    Split the events into the connected components of the conflict graph, in which two events are joined if they have
+    a non-zero score (a shared kid or coach, or a B/C pair).  The total conflict is a sum of pairwise scores, so events
+    in different components never change each other's cost.
+    :return: (components, isolated): a list of sorted arrays of the event ids in each component of two or more events,
+             largest first, and a sorted array of the events that have no score with any other event
+    """
+    linked = conflict_table.symmetric_scores != 0
+    np.fill_diagonal(linked, False)
+    if sparse is not None:
+        num_labels, labels = connected_components(sparse.csr_matrix(linked), directed=False)
+    else:
+        labels = np.full(conflict_table.num_events, -1, dtype=int)
+        num_labels = 0
+        for start in range(conflict_table.num_events):
+            if labels[start] >= 0:
+                continue
+            labels[start] = num_labels
+            frontier = [start]
+            while frontier:
+                reached = np.flatnonzero(linked[frontier].any(axis=0) & (labels < 0))
+                labels[reached] = num_labels
+                frontier = reached.tolist()
+            num_labels += 1
+
+    groups = [np.flatnonzero(labels == label) for label in range(num_labels)]
+    components = sorted([group for group in groups if len(group) > 1], key=len, reverse=True)
+    isolated = np.flatnonzero(~linked.any(axis=1))
+    return components, isolated
+
+
+def merge_top_k(conflict_lists, k):
+    """
+    Find the k lowest sums that take one value from each list
+    :param conflict_lists: Lists of conflicts, each sorted lowest first
+    :param k: The number of sums to return
+    :return: A list of up to k (total conflict, tuple of the index picked in each list) pairs, lowest total first
+    """
+    if not all(conflict_lists):
+        return []
+    start = (0,)*len(conflict_lists)
+    heap = [(sum(conflicts[0] for conflicts in conflict_lists), start)]
+    seen = set([start])
+    merged = []
+    while heap and len(merged) < k:
+        total, indices = heapq.heappop(heap)
+        merged.append((total, indices))
+        # The next candidates each move one list on to its next value
+        for position, index in enumerate(indices):
+            conflicts = conflict_lists[position]
+            if index + 1 < len(conflicts):
+                successor = indices[:position] + (index + 1,) + indices[position + 1:]
+                if successor not in seen:
+                    seen.add(successor)
+                    heapq.heappush(heap, (total - conflicts[index] + conflicts[index + 1], successor))
+    return merged
+
+
+def _search_component(conflict_table, num_shifts, num_results, search_options):
+    """
+    Search one component's table, in a pool worker or in the parent
+    :return: (list of (assignment, order, conflict) for the schedules kept, search_complete, nodes)
+    """
+    schedule = Schedule(conflict_table.roster, conflict_table=conflict_table, num_shifts=num_shifts)
+    stats = SearchStats()
+    best_groupings = start_search(schedule, num_results=num_results, stats=stats, **search_options).run()
+    results = [(compact.assignment, compact.order, compact.conflict) for compact in best_groupings.compact_list()]
+    return results, best_groupings.search_complete, stats.nodes
+
+
+def lining_ups(items, num_shifts):
+    """
+    Generator of every distinct way to put the pieces of a combination into shifts.
+    Each piece is one shift of one component's schedule, or one isolated event.  Pieces of the same component must go
+    in different shifts; anything else may share one.  Shifts are interchangeable, so each shift is numbered by the
+    first piece put in it, and two lining-ups that give the same split of the events are only made once.  Each piece
+    tries the emptiest shift first, so the first lining-up keeps the shifts about the same size.
+    :param items: List of (component index, or None for an isolated event, number of events) for each piece
+    :param num_shifts: The number of shifts to use
+    :return: A generator of lists of the shift of each piece
+    """
+    if not items:
+        yield []
+        return
+    loads = []          # number of events in each shift opened so far
+    members = []        # set of the components with a piece in each shift
+    choice = [None]*len(items)
+    options = [None]*len(items)
+    tried = [0]*len(items)
+
+    def shift_options(level):
+        component = items[level][0]
+        shifts = [shift for shift in range(len(loads)) if component is None or component not in members[shift]]
+        if len(loads) < num_shifts:
+            shifts.append(len(loads))       # open a new shift
+        return sorted(shifts, key=lambda shift: (loads[shift] if shift < len(loads) else 0, shift))
+
+    level = 0
+    options[0] = shift_options(0)
+    while level >= 0:
+        component, size = items[level][0], items[level][1]
+        shift = choice[level]
+        if shift is not None:       # take this piece back out before trying its next shift
+            loads[shift] -= size
+            members[shift].discard(component)
+            if loads[shift] == 0:
+                loads.pop()
+                members.pop()
+            choice[level] = None
+        if tried[level] == len(options[level]):
+            level -= 1
+            continue
+        shift = options[level][tried[level]]
+        tried[level] += 1
+        if shift == len(loads):
+            loads.append(0)
+            members.append(set())
+        loads[shift] += size
+        members[shift].add(component)
+        choice[level] = shift
+        if level == len(items) - 1:
+            yield list(choice)
+        else:
+            level += 1
+            options[level] = shift_options(level)
+            tried[level] = 0
+
+
+def combination_schedules(conflict_table, num_shifts, components, picks, isolated):
+    """
+    Generator of the schedules of the whole roster that put one schedule of each component together.
+    Components don't affect each other's cost, so their shifts can be lined up in any way, and the isolated events can
+    go in any shift.  Each distinct lining-up (see lining_ups) gives a different schedule with the same conflict, most
+    balanced first.
+    :param components: Arrays of the event ids in each component, as from conflict_components
+    :param picks: The (assignment, order, conflict) picked for each component, in the component's own event ids
+    :param isolated: Array of the event ids that have no score with any other event
+    :return: A generator of CompactSchedules
+    """
+    pieces = []     # arrays of event ids, in the order they are added
+    items = []
+    for component, (event_ids, (component_assignment, component_order, _)) in enumerate(zip(components, picks)):
+        ordered = event_ids[component_order]
+        labels = component_assignment[component_order]
+        sizes = np.bincount(labels, minlength=num_shifts)
+        for label in np.argsort(-sizes, kind='mergesort'):      # fullest shift first
+            if sizes[label]:
+                pieces.append(ordered[labels == label])
+                items.append((component, sizes[label]))
+    for event_id in isolated:
+        pieces.append(np.array([event_id], dtype=int))
+        items.append((None, 1))
+
+    placed = np.concatenate(pieces) if pieces else np.zeros(0, dtype=int)
+    conflict = sum(pick[2] for pick in picks)
+    for shifts in lining_ups(items, num_shifts):
+        assignment = np.full(conflict_table.num_events, -1, dtype=int)
+        for piece, shift in zip(pieces, shifts):
+            assignment[piece] = shift
+        order = placed[np.argsort(assignment[placed], kind='mergesort')]      # shift by shift, keeping the order added
+        yield CompactSchedule(conflict_table, assignment, order, num_shifts, conflict)
+
+
+def decomposed_minimize_conflict(schedule, num_results=constants.NUM_SCHEDULE_OPTIONS, processes=None, stats=None,
+                                 **search_options):
+    """
+    Version of minimize_conflict that splits the roster into independent parts first.
+    Events with no score with any other event are placed for free, in the emptiest shifts.  The rest are split into the
+    connected components of the conflict graph (see conflict_components), and each component is searched on its own,
+    on a process pool if there is more than one.  The top num_results schedules of each component are then merged
+    into the num_results lowest-conflict combinations (see merge_top_k).
+    Schedules that only differ in how the shifts of different components line up, or in where the isolated events go,
+    have the same conflict but are different options, so each combination gives as many of them as are needed to
+    fill num_results (see combination_schedules).
+    :param schedule: An empty schedule to optimize.  A schedule with events already in it is searched whole by
+           minimize_conflict, since the placed events fix how the components line up.
+    :param num_results: The number of the best schedule options to return
+    :param processes: Number of worker processes.  Defaults to one per component, up to the number of CPUs.
+    :param search_options: Passed on to the search of each component (see minimize_conflict), e.g. time_limit or
+           max_nodes.  Limits apply to each component separately.
+    :param stats: An optional SearchStats.  It gets the components' total node count and the 'components' and
+           'finished' events (see SearchStats).  Without one the search runs silently.
+    :return: A ScheduleGroup object.  Its search_complete attribute is True if every component's search finished.
+    """
+    if schedule.scheduled_events():
+        return minimize_conflict(schedule, num_results, stats=stats, **search_options)
+
+    conflict_table = schedule.conflict_table
+    num_shifts = len(schedule.shifts)
+    components, isolated = conflict_components(conflict_table)
+    if stats is not None:
+        stats.emit('components', events=conflict_table.num_events, components=len(components), isolated=len(isolated))
+    tables = [conflict_table.subtable(event_ids) for event_ids in components]
+    searched = list(pool_map(_search_component, tables, (num_shifts, num_results, search_options), processes))
+
+    # Each combination gives at least one schedule, so the num_results cheapest combinations are enough
+    candidates = []
+    conflict_lists = [[conflict for _, _, conflict in results] for results, _, _ in searched]
+    for total, indices in merge_top_k(conflict_lists, num_results):
+        picks = [results[index] for (results, _, _), index in zip(searched, indices)]
+        for compact in combination_schedules(conflict_table, num_shifts, components, picks, isolated):
+            if len(candidates) == num_results:
+                break
+            candidates.append(compact)
+        if len(candidates) == num_results:
+            break
+    best_groupings = ScheduleGroup(max_size=num_results)
+    for compact in reversed(candidates):    # the group lists the newest of equal conflicts first
+        best_groupings.put(compact)
+    best_groupings.search_complete = all(search_complete for _, search_complete, _ in searched)
+
+    if stats is not None:
+        stats.nodes += sum(nodes for _, _, nodes in searched)
+        stats.emit('finished', search_complete=best_groupings.search_complete)
+    return best_groupings
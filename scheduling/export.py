@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import numpy as np
+from conflict import weighted_overlap
+
+
+def shift_report(schedule, index):
+    """
+    Summarize one shift of a schedule: its events and the students and coaches who have conflicts in it.
+    A person in n events of the shift is listed once per pair of those events, n*(n-1)/2 times.
+    :param index: The shift index
+    :return: A dict of plain lists and strings
+    """
+    shift = schedule.shifts[index]
+    roster = schedule.events
+    table = schedule.conflict_table
+    event_ids = np.array(shift.events, dtype=int)
+
+    # Find the pairs with someone in common from who is in each event rather than from the scores, so that people whose
+    # custom conflict factor is 0 are still listed.  B/C counterparts never register conflicts.
+    shared_kids = weighted_overlap(roster.kid_incidence[event_ids], np.ones(len(roster.kid_names)))
+    coach_ids = roster.coach_ids[event_ids]
+    shared_coach = (coach_ids[:, None] == coach_ids[None, :]) & (coach_ids >= 0)[:, None]
+    counterparts = table.ms_hs_pairs[np.ix_(event_ids, event_ids)] != 0
+    shared = ((shared_kids > 0) | shared_coach) & ~(counterparts | counterparts.T)
+    students = []
+    coaches = []
+    for i, j in zip(*np.nonzero(np.tril(shared, -1))):      # same pair order as the old per-shift scan
+        first, second = event_ids[i], event_ids[j]
+        students += sorted(roster.kid_names[kid_id] for kid_id in table.shared_kid_ids(first, second))
+        coach_id = table.shared_coach_id(first, second)
+        if coach_id is not None:
+            coaches.append(roster.coach_names[coach_id])
+
+    events = [{'name': roster[event_id].name,
+               'division': 'C' if roster[event_id].hs else 'B',
+               'coach': roster[event_id].coach,
+               'students': list(roster[event_id].kids)} for event_id in shift.events]
+    return {'shift': index,
+            'conflict': shift.conflict_sum,
+            'students_with_conflicts': students,
+            'coaches_with_conflicts': coaches,
+            'events': events}
+
+
+def schedule_report(schedule, option=0):
+    """
+    :param option: The schedule's option number in its ScheduleGroup
+    :return: A dict summarizing the schedule and each of its shifts, which can be saved as JSON
+    """
+    return {'option': option,
+            'conflict': schedule.total_conflict(),
+            'shifts': [shift_report(schedule, index) for index in range(len(schedule.shifts))]}
+
+
+class ScheduleResults(object):
+    """
+    A read-only snapshot of the schedules in a ScheduleGroup, lowest conflict first.
+    Each schedule's conflict report is computed the first time it is needed and reused by every export format.
+    """
+    def __init__(self, schedules):
+        """
+        :param schedules: A list of schedules, in option order
+        """
+        self.schedules = tuple(schedules)
+        self._reports = [None]*len(self.schedules)
+
+    def __len__(self):
+        return len(self.schedules)
+
+    def __getitem__(self, option):
+        return self.schedules[option]
+
+    def __iter__(self):
+        return iter(self.schedules)
+
+    def report(self, option):
+        """
+        :return: The (cached) report for schedule option 'option'.  See schedule_report.
+        """
+        if self._reports[option] is None:
+            self._reports[option] = schedule_report(self.schedules[option], option)
+        return self._reports[option]
+
+    def reports(self):
+        """
+        :return: A list of the reports for every option
+        """
+        return [self.report(option) for option in range(len(self))]
+
+    def save_csv(self, basename, folder):
+        """
+        Save each option in its own csv file
+        :param basename: csv file base. Files will be named basename_option0.csv, basename_option1.csv ...
+        :param folder: the folder to save in
+        :return: The list of file names written
+        """
+        filenames = []
+        for report in self.reports():
+            filename = os.path.join(folder, '{}_option{}.csv'.format(basename, report['option']))
+            with open(filename, 'wb') as outfile:
+                _write_report(csv.writer(outfile), report)
+            filenames.append(filename)
+        return filenames
+
+    def save_combined_csv(self, filename):
+        """
+        Save every option in a single csv file, one block per option
+        """
+        with open(filename, 'wb') as outfile:
+            writer = csv.writer(outfile)
+            for report in self.reports():
+                _write_report(writer, report)
+                writer.writerow(['==='])
+
+    def save_json(self, filename):
+        """
+        Save the reports for every option in a JSON file
+        """
+        with open(filename, 'wb') as outfile:
+            json.dump(self.reports(), outfile, indent=4)
+
+    def save(self, basename, folder, formats=('csv',)):
+        """
+        Save the results in several formats at once
+        :param formats: Any of 'csv' (one file per option), 'combined' (basename.csv) and 'json' (basename.json)
+        :return: The list of file names written
+        """
+        filenames = []
+        if 'csv' in formats:
+            filenames += self.save_csv(basename, folder)
+        if 'combined' in formats:
+            filenames.append(os.path.join(folder, basename + '.csv'))
+            self.save_combined_csv(filenames[-1])
+        if 'json' in formats:
+            filenames.append(os.path.join(folder, basename + '.json'))
+            self.save_json(filenames[-1])
+        return filenames
+
+
+def _write_report(writer, report):
+    """
+    Write one schedule report with a csv writer, in the layout of the original per-option csv files
+    """
+    fieldnames = ['Event Name', 'B/C', 'Coach', 'Students']
+    writer.writerow(['Option {}'.format(report['option'])])
+    writer.writerow(['Conflict Score:', report['conflict']])
+    writer.writerow([])
+    for shift in report['shifts']:
+        students = shift['students_with_conflicts']
+        coaches = shift['coaches_with_conflicts']
+        writer.writerow(['...'])
+        writer.writerow(['Shift {}:'.format(shift['shift'])])
+        writer.writerow(['Conflict Summary:'])
+        writer.writerow(['Student Conflicts', 'Coach Conflicts', 'Total'])
+        writer.writerow([len(students), len(coaches), len(students)+len(coaches)])
+        writer.writerow([])
+        writer.writerow(['Students with conflicts:'] + students)
+        writer.writerow(['Coaches with conflicts:'] + coaches)
+        writer.writerow([])
+        writer.writerow(fieldnames)
+        for event in shift['events']:
+            writer.writerow([event['name'], event['division'], event['coach'], ', '.join(event['students'])])
+        writer.writerow([])
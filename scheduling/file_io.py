@@ -1,6 +1,23 @@
 import csv
 import json
 from schedule_components import Event
+from roster import Roster
+
+
+class RosterFileError(ValueError):
+    """
+    Raised when a roster file can't be read or has bad entries.  The message lists every problem found.
+    """
+    pass
+
+
+class _BadRecord(object):
+    """
+    Yielded by a record reader in place of an event info dict for a record it couldn't parse, so that
+    validated_events reports it along with every other problem in the file
+    """
+    def __init__(self, message):
+        self.message = message
 
 
 def events_from_dicts(event_info_list):
@@ -16,45 +33,75 @@ def events_from_dicts(event_info_list):
     return all_events
 
 
-def events_from_json(filename):
+def json_records(filename):
     """
-    Create a list of events from a JSON file of event info
-    TODO: Incorporate whether an event is marked as B or C
+    Read event info from a JSON file: a list of objects with 'name', 'kids', 'coach' and 'hs' (true for C division)
+    :return: A generator of (location, event info dict) pairs
     """
     with open(filename) as ifile:
-        event_dicts = json.load(ifile)
-    return events_from_dicts(event_dicts)
+        try:
+            event_dicts = json.load(ifile)
+        except ValueError as error:
+            raise RosterFileError("{}: not valid JSON ({})".format(filename, error))
+    if not isinstance(event_dicts, list):
+        raise RosterFileError("{}: expected a list of events".format(filename))
+    for position, event_info in enumerate(event_dicts):
+        yield 'event {}'.format(position), event_info
 
 
-def events_from_csv(filename):
+# Column names accepted by csv_records, lower case.  The first set matches the columns of the exported schedules.
+CSV_COLUMNS = {'event name': 'name', 'name': 'name', 'event': 'name',
+               'students': 'kids', 'kids': 'kids',
+               'coach': 'coach',
+               'b/c': 'hs', 'division': 'hs', 'hs': 'hs'}
+
+# Values accepted in the division column, lower case
+DIVISIONS = {'c': True, 'b': False, 'true': True, 'false': False}
+
+
+def csv_records(filename):
     """
-    Note: I haven't tested this function because I don't have a csv version of the event assignments.
-    Please test this before use Matthew!
+    Read event info from a csv file with a header row.  Each following row is one event: its name, its students
+    separated by commas, its coach (blank or 'none' for no coach) and its division ('B' or 'C').  The columns can be in
+    any order and are found by name (see CSV_COLUMNS), so the event table of an exported schedule can be loaded.
+    Without a division column every event is C division.
+    :return: A generator of (location, event info dict) pairs
     """
-    # TODO: add a way to specify if each event is middle school or high school - we need this so we can break them up if necessary for scheduling purposes
+    with open(filename, 'rU') as ifile:
+        event_reader = csv.reader(ifile, dialect='excel')
+        header = next(event_reader, None)
+        if header is None:
+            raise RosterFileError("{}: file is empty".format(filename))
+        fields = [CSV_COLUMNS.get(column.strip().lower()) for column in header]
+        missing = set(['name', 'kids']).difference(fields)
+        if missing:
+            raise RosterFileError("{}: header has no {} column".format(filename, ' or '.join(sorted(missing))))
 
-    all_events = []
-    with open(filename) as ifile:
-        event_reader = csv.reader(filename, dialect='excel')
-        event_reader.next()     # skip column names
         for line in event_reader:
-            e = Event(
-                name=line[0],
-                kids=line[1].split(','),
-                coach=line[2])
-            all_events.append(e)
-
-    return all_events
+            if not any(cell.strip() for cell in line):
+                continue
+            event_info = {'coach': None, 'hs': True}
+            for field, cell in zip(fields, line):
+                cell = cell.strip()
+                if field == 'kids':
+                    event_info['kids'] = [kid.strip() for kid in cell.split(',') if kid.strip()]
+                elif field == 'coach':
+                    event_info['coach'] = cell if cell and cell.lower() != 'none' else None
+                elif field == 'hs':
+                    event_info['hs'] = DIVISIONS.get(cell.lower(), cell)
+                elif field is not None:
+                    event_info[field] = cell
+            yield 'line {}'.format(event_reader.line_num), event_info
 
 
-def event_info_from_mattheroni(filename):
+def mattheroni_records(filename):
     """
-    Load events from Matthew's old custom file format
-    TODO: Incorporate whether an event is marked as B or C into the events produced
+    Read event info from Matthew's old custom file format, one line at a time.  Each line is '@name;kids,...,coach'
+    for a study event or '!name;kids,...,coach' for a build/lab event.
+    :return: A generator of (location, event info dict) pairs.  Lines that can't be split up are yielded as _BadRecords.
     """
-    event_info_list = []
     with open(filename) as fh:
-        for line in fh:
+        for line_number, line in enumerate(fh, 1):
             line = line.rstrip()
 
             # deal with skippable lines
@@ -65,8 +112,12 @@ def event_info_from_mattheroni(filename):
 
             # normal assignment line
             spl = line.split(';')
+            location = 'line {}'.format(line_number)
+            if len(spl) != 2:
+                yield location, _BadRecord("expected 'name;kids,...,coach'")
+                continue
 
-            build = spl[0][0] == '!'
+            build = spl[0][:1] == '!'      # a line with no name is reported by validated_events
             name = spl[0][1:]
 
             people = spl[1].split(',')
@@ -78,30 +129,109 @@ def event_info_from_mattheroni(filename):
             # Divide into B/C events. WARNING: FOR TESTING PURPOSES ONLY - THIS IS NOT ACCURATE
             if len(kids) > 3:
                 divider = int(len(kids)/2)
-                event_info_list.append({
+                yield location, {
                     'name': name,
                     'build_event': build,
                     'coach': coach,
                     'kids': kids[:divider],
                     'hs': True
-                })
+                }
                 kids = kids[divider:]
 
-            event_info_list.append({
+            yield location, {
                 'name': name,
                 'build_event': build,
                 'coach': coach,
                 'kids': kids,
                 'hs': False
-            })
+            }
+
 
-    return event_info_list
+# Record readers by file extension
+RECORD_READERS = {'json': json_records, 'csv': csv_records, 'txt': mattheroni_records}
+
+
+def _is_name(value):
+    return isinstance(value, basestring) and bool(value.strip())
+
+
+def validated_events(records, filename):
+    """
+    Check event info records and turn them into events as they stream past.
+    Problems are collected rather than raised one at a time, so a bad file can be fixed in one go.
+    :param records: An iterable of (location, event info dict) pairs
+    :param filename: The file name to put in error messages
+    :return: A generator of Event objects.  It raises a RosterFileError listing every problem once the records run out.
+    """
+    problems = []
+    seen = {}       # (name, hs) -> location of the first event with that name and division
+    for location, event_info in records:
+        if isinstance(event_info, _BadRecord):
+            problems.append("{}: {}".format(location, event_info.message))
+            continue
+        if not isinstance(event_info, dict):
+            problems.append("{}: expected an object of event info".format(location))
+            continue
+
+        name = event_info.get('name')
+        kids = event_info.get('kids')
+        coach = event_info.get('coach')
+        hs = event_info.get('hs', True)
+        errors = []
+        if not _is_name(name):
+            errors.append("missing or blank event name")
+        if not isinstance(kids, list) or not all(_is_name(kid) for kid in kids):
+            errors.append("kids must be a list of names")
+        elif len(set(kids)) != len(kids):
+            errors.append("a kid is listed more than once")
+        if coach is not None and not _is_name(coach):
+            errors.append("coach must be a name or null")
+        if not isinstance(hs, bool):
+            errors.append("division must be B or C (hs false or true), not {!r}".format(hs))
+        elif _is_name(name):
+            # Checked even when the event has other problems, so that a later copy of a bad event is reported too
+            if (name, hs) in seen:
+                errors.append("duplicate of the {} division event at {}".format('C' if hs else 'B', seen[(name, hs)]))
+            else:
+                seen[(name, hs)] = location
+        if errors:
+            problems += ["{}: {}".format(location, error) for error in errors]
+            continue
+
+        yield Event(name=name, kids=kids, coach=coach, hs=hs)
+
+    if problems:
+        raise RosterFileError("{} has {} problem(s):\n  {}".format(filename, len(problems), '\n  '.join(problems)))
+
+
+def events_from_json(filename):
+    """
+    Create a list of events from a JSON file of event info
+    """
+    return list(validated_events(json_records(filename), filename))
+
+
+def events_from_csv(filename):
+    """
+    Create a list of events from a csv file of event info.  See csv_records for the layout.
+    """
+    return list(validated_events(csv_records(filename), filename))
+
+
+def event_info_from_mattheroni(filename):
+    """
+    Load events from Matthew's old custom file format
+    :return: A list of event info dicts
+    :raises RosterFileError: If the file has bad entries (see validated_events)
+    """
+    records = list(mattheroni_records(filename))
+    for _ in validated_events(records, filename):       # only run for the problems it raises
+        pass
+    return [event_info for _, event_info in records]
 
 
 def events_from_mattheroni(filename):
-    event_info = event_info_from_mattheroni(filename)
-    events = events_from_dicts(event_info)
-    return events
+    return list(validated_events(mattheroni_records(filename), filename))
 
 
 def mattheroni_to_json(m_file, output_file):
@@ -115,17 +245,14 @@ def mattheroni_to_json(m_file, output_file):
 def load_events(filename):
     """
     Load events from file.
-    Calls more specific file-loading functions depending on filename extension
+    The file is read with the record reader for its extension (see RECORD_READERS), and its events are checked and
+    interned into a Roster as they are read, without building an intermediate list.
+    :return: A Roster of the loaded events
+    :raises RosterFileError: If the file type isn't recognized or the file has bad entries
     """
     print('Loading events...')
 
-    file_ext = filename.split('.')[-1]      # Don't use this function on files without extensions
-
-    if file_ext == 'json':
-        return events_from_json(filename)
-    elif file_ext == 'csv':
-        return events_from_csv(filename)
-    elif file_ext == 'txt':                 # TODO: change this behavior if Matthew's file format is updated or has a different extension
-        return events_from_mattheroni(filename)
-
-    print "ERROR: File type not recognized"
+    file_ext = filename.split('.')[-1].lower()      # Don't use this function on files without extensions
+    if file_ext not in RECORD_READERS:              # TODO: change the txt reader if Matthew's file format is updated or has a different extension
+        raise RosterFileError("{}: file type not recognized".format(filename))
+    return Roster(validated_events(RECORD_READERS[file_ext](filename), filename))
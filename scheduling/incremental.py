@@ -0,0 +1,89 @@
+import time
+import numpy as np
+from optimization import ScheduleGroup, ConflictSearch, RemainingConflictBound, dsatur_assignment
+from schedule_components import Schedule
+
+
+def transfer_schedule(schedule, conflict_table):
+    """
+    Move a schedule onto another conflict table, matching events by name and B/C division
+    :return: A new schedule on conflict_table with every event that is in both rosters in the same shift as before.
+             Events that are only in the new roster are left out.
+    """
+    transferred = Schedule(conflict_table.roster, conflict_table=conflict_table, num_shifts=len(schedule.shifts))
+    for shift, new_shift in zip(schedule.shifts, transferred.shifts):
+        for event_id in shift.events:
+            event = schedule.events[event_id]
+            new_id = conflict_table.roster.event_index.get((event.name, event.hs))
+            if new_id is not None:
+                new_shift.add_event(new_id)
+    transferred.sort_shifts()
+    return transferred
+
+
+def neighbourhood(conflict_table, event_ids, radius=1):
+    """
+    :param event_ids: Array of event ids
+    :param radius: Number of steps to take along non-zero conflict scores
+    :return: Array of the ids of the given events and of every event within 'radius' steps of them
+    """
+    linked = conflict_table.symmetric_scores != 0
+    inside = np.zeros(conflict_table.num_events, dtype=bool)
+    inside[event_ids] = True
+    for step in range(radius):
+        inside |= linked[inside].any(axis=0)
+    return np.flatnonzero(inside)
+
+
+def reoptimize(previous, events, num_results=None, repair_radius=1, repair_schedules=None, time_limit=None,
+               max_nodes=None, stats=None):
+    """
+    Update the results of an earlier run after the roster was edited, e.g. a kid joined or dropped an event.
+    The conflict table is updated for the changed events only.  The previous schedules are re-scored against it (new
+    events are placed greedily) and seed the results.  Then a repair search re-places only the events near the change,
+    keeping every other event in the shift it had.
+    :param previous: The ScheduleGroup returned by the earlier run.  It is not changed, and must hold at least one schedule.
+    :param events: The edited Roster or list of events, e.g. loaded from the updated input file
+    :param num_results: The number of schedule options to return.  Defaults to the size of previous.
+    :param repair_radius: Events within this many conflict-graph steps of a changed event are re-placed by the repair
+           search.  Use 0 to re-place only the changed events, or None to skip the repair search.
+    :param repair_schedules: Number of previous schedules to repair, best first.  Defaults to all of them.
+    :param time_limit: Time limit in seconds for all repair searches together
+    :param max_nodes: Node limit for each repair search
+    :param stats: An optional SearchStats for the repair searches
+    :return: A ScheduleGroup of the best schedules found.  Its search_complete attribute is False, since only part of
+             the search space around the previous schedules is searched.
+    """
+    old_schedules = previous.schedule_list()
+    if not old_schedules:
+        raise ValueError("the previous ScheduleGroup is empty, so there are no schedules to update")
+    table, changed = old_schedules[0].conflict_table.updated(events)
+    best_groupings = ScheduleGroup(max_size=num_results or previous.max_size,
+                                   callback=stats.callback if stats is not None else None)
+
+    # Re-score the previous schedules, with any new events placed greedily
+    transferred = [transfer_schedule(schedule, table) for schedule in old_schedules]
+    for schedule in transferred:
+        rescored = Schedule(table.roster, conflict_table=table, num_shifts=len(schedule.shifts))
+        rescored.add_assignment(dsatur_assignment(schedule))
+        best_groupings.put(rescored)
+
+    if repair_radius is None or not len(changed):
+        return best_groupings
+
+    # Repair: take the events near the change back out of each previous schedule and search over them
+    free = neighbourhood(table, changed, repair_radius)
+    deadline = time.time() + time_limit if time_limit is not None else None
+    for schedule in transferred[:repair_schedules]:
+        remaining = deadline - time.time() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            break
+        assignment = schedule.assignment()
+        assignment[free] = -1
+        partial = Schedule(table.roster, conflict_table=table, num_shifts=len(schedule.shifts))
+        partial.add_assignment(assignment)
+        partial.sort_shifts()
+        ConflictSearch(partial, best_groupings, RemainingConflictBound(partial), time_limit=remaining,
+                       max_nodes=max_nodes, stats=stats).run()
+    best_groupings.search_complete = False
+    return best_groupings
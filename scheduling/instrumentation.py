@@ -0,0 +1,113 @@
+import collections
+import contextlib
+import time
+
+
+class SearchStats(object):
+    """
+    Counters, timings and a progress hook for one run of the conflict search.
+    Pass one to minimize_conflict (or start_search) to collect it; without one the search only does a few
+    'is None' checks per node.
+    The callback is called as callback(event, info) where info is a dict.  Events are:
+        'threshold'       the ScheduleGroup's threshold dropped; info has 'threshold'
+        'schedule_found'  a complete schedule was reached; info has 'conflict' and 'schedule' (the live search state,
+                          copy it to keep it)
+        'improvement'     a schedule beat every earlier one; info has 'conflict'
+        'progress'        sent every progress_interval nodes; info has 'nodes' and 'elapsed'
+        'phase'           a phase of minimize_conflict finished; info has 'phase' and 'seconds'
+        'split'           parallel_minimize_conflict split the search; info has 'subproblems' and 'processes'
+        'components'      decomposed_minimize_conflict split the roster; info has 'events', 'components' and 'isolated'
+        'finished'        a search function is about to return its results; info has 'search_complete'
+    """
+    def __init__(self, callback=None, progress_interval=100000):
+        """
+        :param callback: Optional function called with (event, info) as the search runs.  See print_progress.
+        :param progress_interval: Number of nodes between 'progress' events
+        """
+        self.callback = callback
+        self.progress_interval = progress_interval
+        self.start_time = time.time()
+
+        self.nodes = 0                                  # nodes expanded, over every search that used these stats
+        self.leaves = 0                                 # complete schedules reached
+        self.prunes = collections.Counter()             # prunes by reason: 'threshold', 'bound' or 'transposition'
+        self.depth_histogram = collections.Counter()    # number of nodes expanded at each depth
+        self.phase_times = collections.OrderedDict()    # seconds spent in each phase, in the order they ran
+
+    def emit(self, event, **info):
+        """
+        Pass an event to the callback, if there is one
+        """
+        if self.callback is not None:
+            self.callback(event, info)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager that adds the time spent inside it to phase_times[name]
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - start
+            self.phase_times[name] = self.phase_times.get(name, 0) + seconds
+            self.emit('phase', phase=name, seconds=seconds)
+
+    def summary(self):
+        """
+        :return: A dict of all counters and timings, e.g. for saving as JSON
+        """
+        return {
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'prunes': dict(self.prunes),
+            'depth_histogram': [self.depth_histogram[depth] for depth in range(max(self.depth_histogram) + 1)]
+                               if self.depth_histogram else [],
+            'phase_times': dict(self.phase_times),
+            'elapsed': time.time() - self.start_time,
+        }
+
+    def report(self):
+        """
+        :return: A short human-readable summary
+        """
+        lines = ["Nodes expanded: {}".format(self.nodes),
+                 "Complete schedules reached: {}".format(self.leaves),
+                 "Prunes: " + ", ".join("{} {}".format(count, reason) for reason, count in sorted(self.prunes.items()))]
+        lines += ["{} time: {:.2f}s".format(name.capitalize(), seconds) for name, seconds in self.phase_times.items()]
+        return "\n".join(lines)
+
+
+def print_progress(event, info):
+    """
+    A SearchStats callback that prints progress messages
+    """
+    if event == 'threshold':
+        print "New Threshold: {}".format(info['threshold'])
+    elif event == 'schedule_found':
+        print "Possible order found.  " + info['schedule'].status()
+    elif event == 'progress':
+        print "{} nodes searched in {:.1f}s".format(info['nodes'], info['elapsed'])
+    elif event == 'split':
+        print "Split search into {} subproblems on {} processes".format(info['subproblems'], info['processes'])
+    elif event == 'components':
+        print "Split {} events into {} components and {} isolated events".format(info['events'], info['components'],
+                                                                                 info['isolated'])
+    elif event == 'finished':
+        print "Finished optimizing schedules." if info['search_complete'] else "Search budget used up; returning the best schedules found."
+
+
+class _NoPhase(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def timed_phase(stats, name):
+    """
+    :return: stats.phase(name), or a context manager that does nothing if stats is None
+    """
+    return _NoPhase() if stats is None else stats.phase(name)
@@ -0,0 +1,223 @@
+import math
+import numpy as np
+import constants
+from optimization import ScheduleGroup, TIE_TOLERANCE, dsatur_assignment
+from schedule_components import Schedule, assignment_key
+from worker_pool import pool_map
+
+
+def assignment_costs(scores, assignment, num_shifts):
+    """
+    :param scores: The conflict table's symmetric score matrix
+    :param assignment: An array holding the shift index of each event (-1 for events that are not scheduled)
+    :return: A (shift x event) matrix holding the conflict each event has with the events in each shift
+    """
+    in_shift = np.zeros([num_shifts, len(assignment)])
+    scheduled = np.flatnonzero(assignment >= 0)
+    in_shift[assignment[scheduled], scheduled] = 1
+    return in_shift.dot(scores)
+
+
+class LocalSearch(object):
+    """
+    Move and swap local search over complete assignments of events to shifts.
+    The state is the assignment plus a (shift x event) matrix of the conflict each event has with each shift, so the
+    change in total conflict of every possible move and swap comes out of a few array operations.
+    """
+    def __init__(self, scores, assignment, num_shifts, rng):
+        """
+        :param scores: The conflict table's symmetric score matrix
+        :param assignment: A starting assignment holding a shift index for every event
+        :param num_shifts: Number of shifts
+        :param rng: A numpy RandomState
+        """
+        self.scores = scores
+        self.assignment = np.array(assignment, dtype=int)
+        self.num_shifts = num_shifts
+        self.rng = rng
+        self.event_ids = np.arange(len(self.assignment))
+        self.costs = assignment_costs(scores, self.assignment, num_shifts)
+        self.conflict = self.costs[self.assignment, self.event_ids].sum() / 2
+
+    def move_deltas(self):
+        """
+        :return: A (shift x event) array holding the change in conflict from moving each event to each shift
+        (zero for the shift an event is already in)
+        """
+        return self.costs - self.costs[self.assignment, self.event_ids]
+
+    def swap_deltas(self):
+        """
+        :return: An (event x event) array holding the change in conflict from swapping the shifts of two events
+        (inf for events that are in the same shift)
+        """
+        # into_other[e, f] is the change from moving e to f's shift, if f stayed there
+        into_other = self.costs[self.assignment].T - self.costs[self.assignment, self.event_ids][:, None]
+        deltas = into_other + into_other.T - 2 * self.scores      # e and f no longer share a shift after the swap
+        deltas[self.assignment[:, None] == self.assignment[None, :]] = np.inf
+        return deltas
+
+    def move(self, event_id, index):
+        """
+        Move an event to shift 'index'
+        """
+        old_index = self.assignment[event_id]
+        self.conflict += self.costs[index, event_id] - self.costs[old_index, event_id]
+        self.costs[old_index] -= self.scores[event_id]
+        self.costs[index] += self.scores[event_id]
+        self.assignment[event_id] = index
+
+    def swap(self, event1, event2):
+        """
+        Swap the shifts of two events
+        """
+        index1 = self.assignment[event1]
+        self.move(event1, self.assignment[event2])
+        self.move(event2, index1)
+
+    def tabu_step(self, iteration, tabu_until, tenure, best_conflict):
+        """
+        Make the best move or swap that doesn't involve a tabu event.  Tabu moves are still allowed if they beat best_conflict.
+        :param iteration: The current iteration number
+        :param tabu_until: An array holding the iteration until which each event may not be moved.  Updated in place.
+        :param tenure: Number of iterations an event stays tabu after it is moved
+        :param best_conflict: The best conflict found so far
+        """
+        moves = self.move_deltas()
+        moves[self.assignment, self.event_ids] = np.inf
+        swaps = self.swap_deltas()
+
+        tabu = tabu_until > iteration
+        aspiration = best_conflict - TIE_TOLERANCE - self.conflict
+        moves[:, tabu] = np.where(moves[:, tabu] < aspiration, moves[:, tabu], np.inf)
+        swap_tabu = tabu[:, None] | tabu[None, :]
+        swaps[swap_tabu] = np.where(swaps[swap_tabu] < aspiration, swaps[swap_tabu], np.inf)
+
+        best_move = moves.min()
+        best_swap = swaps.min()
+        if min(best_move, best_swap) == np.inf:
+            return
+
+        # Break ties at random so that chains with different seeds explore differently
+        if best_move <= best_swap:
+            shifts, events = np.nonzero(moves <= best_move + TIE_TOLERANCE)
+            choice = self.rng.randint(len(events))
+            self.move(events[choice], shifts[choice])
+            moved = [events[choice]]
+        else:
+            events1, events2 = np.nonzero(swaps <= best_swap + TIE_TOLERANCE)
+            choice = self.rng.randint(len(events1))
+            self.swap(events1[choice], events2[choice])
+            moved = [events1[choice], events2[choice]]
+        tabu_until[moved] = iteration + tenure + self.rng.randint(tenure // 2 + 1)
+
+    def anneal_step(self, temperature, swap_probability):
+        """
+        Propose a random move or swap and accept it with the Metropolis rule
+        """
+        if self.num_shifts < 2:
+            return      # every event is in the only shift, so there is no other schedule to move to
+        event1 = self.rng.randint(len(self.assignment))
+        index1 = self.assignment[event1]
+        if self.rng.rand() < swap_probability:
+            event2 = self.rng.randint(len(self.assignment))
+            index2 = self.assignment[event2]
+            if index1 == index2:
+                return
+            delta = self.costs[index2, event1] - self.costs[index1, event1] \
+                    + self.costs[index1, event2] - self.costs[index2, event2] - 2 * self.scores[event1, event2]
+            if delta <= 0 or self.rng.rand() < math.exp(-delta / temperature):
+                self.swap(event1, event2)
+        else:
+            index2 = (index1 + 1 + self.rng.randint(self.num_shifts - 1)) % self.num_shifts
+            delta = self.costs[index2, event1] - self.costs[index1, event1]
+            if delta <= 0 or self.rng.rand() < math.exp(-delta / temperature):
+                self.move(event1, index2)
+
+
+def run_chain(schedule, num_results, method, iterations, seed, tenure=None, start_temperature=0.3, end_temperature=0.02,
+              swap_probability=0.3):
+    """
+    Run one local search chain from the DSATUR greedy schedule (see dsatur_assignment)
+    :return: A list of (conflict, assignment) pairs for the best distinct schedules the chain visited, best first
+    """
+    rng = np.random.RandomState(seed)
+    num_shifts = len(schedule.shifts)
+    scores = schedule.conflict_table.symmetric_scores
+    start = schedule.copy()
+    start.sort_shifts()     # dsatur_assignment needs the non-empty shifts first; the caller's schedule is left as it is
+    search = LocalSearch(scores, dsatur_assignment(start), num_shifts, rng)
+    if tenure is None:
+        tenure = max(5, len(search.assignment) // 10)
+
+    kept = {}       # canonical assignment -> (conflict, assignment) for the best distinct schedules
+    threshold = float('inf')
+    best_conflict = search.conflict
+    tabu_until = np.zeros(len(search.assignment), dtype=int)
+    cooling = (end_temperature / start_temperature) ** (1.0 / max(iterations - 1, 1))
+    temperature = start_temperature
+
+    for iteration in range(iterations + 1):
+        if iteration > 0:
+            if method == 'tabu':
+                search.tabu_step(iteration, tabu_until, tenure, best_conflict)
+            else:
+                search.anneal_step(temperature, swap_probability)
+                temperature *= cooling
+        best_conflict = min(best_conflict, search.conflict)
+
+        # Keep the best num_results distinct schedules seen
+        if search.conflict < threshold - TIE_TOLERANCE or len(kept) < num_results:
+            key = assignment_key(search.assignment)
+            if key not in kept:
+                kept[key] = (search.conflict, search.assignment.copy())
+                if len(kept) > num_results:
+                    del kept[max(kept, key=lambda k: kept[k][0])]
+                if len(kept) == num_results:
+                    threshold = max(conflict for conflict, assignment in kept.values())
+    return sorted(kept.values(), key=lambda item: item[0])
+
+
+def _run_seeded_chain(seed, schedule, chain_options):
+    return run_chain(schedule, seed=seed, **chain_options)
+
+
+# Default number of steps per chain.  An annealing step only looks at one move, so it is much cheaper than a tabu step,
+# which looks at them all.
+DEFAULT_ITERATIONS = {'tabu': 5000, 'anneal': 100000}
+
+
+def local_search(schedule, num_results=constants.NUM_SCHEDULE_OPTIONS, method='tabu', iterations=None, chains=1,
+                 processes=None, seed=None, **options):
+    """
+    Heuristic alternative to minimize_conflict for rosters too large for the exact search.
+    Each chain starts from the DSATUR greedy schedule (see dsatur_assignment) and repeatedly moves one event to another shift or swaps the shifts of
+    two events.  The change in conflict of each move or swap is computed from the conflict table's score matrix.
+    :param schedule: A schedule object to optimize.  Events already in shifts are used as part of the starting point, but may be moved.
+    :param num_results: The number of the best schedule options to return
+    :param method: 'tabu' to make the best non-tabu move or swap at every step, or 'anneal' for simulated annealing
+    :param iterations: Number of steps per chain.  Defaults to DEFAULT_ITERATIONS[method].
+    :param chains: Number of independent chains, each with its own random seed
+    :param processes: Number of processes to run chains on.  Defaults to one per chain, up to the number of CPUs.
+    :param seed: Random seed of the first chain; chain i uses seed + i
+    :param options: Passed on to run_chain (tenure, start_temperature, end_temperature, swap_probability)
+    :return: A ScheduleGroup of the best distinct schedules found by all chains.  Its search_complete attribute is always False.
+    """
+    if method not in ('tabu', 'anneal'):
+        raise ValueError("method must be 'tabu' or 'anneal', not {!r}".format(method))
+    if iterations is None:
+        iterations = DEFAULT_ITERATIONS[method]
+    if seed is None:
+        seed = np.random.randint(2**31 - chains)
+    seeds = [seed + chain for chain in range(chains)]
+    chain_options = dict(options, num_results=num_results, method=method, iterations=iterations)
+
+    chain_results = pool_map(_run_seeded_chain, seeds, (schedule, chain_options), processes)
+
+    best_groupings = ScheduleGroup(max_size=num_results)     # drops schedules found by more than one chain
+    for results in chain_results:
+        for conflict, assignment in results:
+            found = Schedule(schedule.events, conflict_table=schedule.conflict_table, num_shifts=len(schedule.shifts))
+            found.add_assignment(assignment)
+            best_groupings.put(found)
+    return best_groupings
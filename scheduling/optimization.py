@@ -1,68 +1,113 @@
-import Queue
-import csv
+import heapq
+import itertools
 import os
+import pickle
+import time
+import numpy as np
 import constants
+from schedule_components import Schedule, CompactSchedule, assignment_key
+from instrumentation import timed_phase
+from export import ScheduleResults
+from conflict import conflict_cache_key
+
+# Conflict scores that differ by less than this are treated as equal.
+# Running cost vectors are updated by adding and subtracting rows, so equal costs can differ by rounding error.
+TIE_TOLERANCE = 1e-9
 
 
 class ScheduleGroup(object):
     """
     An object that holds several different schedule options.
     Used and returned by the minimize_conflict function
+    Schedules are kept as CompactSchedules, and two schedules that put the same events together are only kept once.
     """
-    def __init__(self, max_size=5, initial_threshold=20):
+    def __init__(self, max_size=5, initial_threshold=None, callback=None):
+        """
+        :param max_size: The number of schedules to keep
+        :param initial_threshold: Schedules with at least this much conflict are never kept.  If None, any schedule can be
+               kept until the group is full.  minimize_conflict seeds the group with greedy schedules instead (see warm_start).
+        :param callback: Optional function called as callback('threshold', {'threshold': value}) when the threshold drops
+               (see SearchStats)
+        """
+        if initial_threshold is None:
+            initial_threshold = float('inf')
         self.schedules = []
-        self.mpq = Queue.PriorityQueue()
+        self.heap = []      # heap of (-conflict, insertion count, CompactSchedule), so the highest-conflict schedule is at heap[0]
+        self.keys = set()   # keys of the CompactSchedules in the heap
+        self.insertion_count = itertools.count()       # breaks ties between equal conflicts without comparing schedules
         self.max_size = max_size
         self.initial_threshold = initial_threshold
         self.threshold = initial_threshold
+        # Set by the search once it has walked its whole search tree.  The search only branches on the shifts tied for
+        # an event's cheapest insertion (and without a bound, prunes on the conflict so far), so this doesn't prove the
+        # schedules optimal.
+        self.search_complete = False
+        self.callback = callback
 
     def remove_largest_element(self):
-        largest = self.mpq.get()
+        largest = heapq.heappop(self.heap)
+        self.keys.discard(largest[2].key)
         self.update_threshold()
         return largest
 
     def put(self, schedule):
         """
         Add a schedule to the ScheduleGroup
+        :param schedule: A Schedule, which is encoded as a CompactSchedule, or a CompactSchedule
         """
-        schedule_conflict = schedule.total_conflict()
+        schedule_conflict = schedule.conflict if isinstance(schedule, CompactSchedule) else schedule.total_conflict()
 
-        # Don't add the new schedule if the mpq is full and it's conflict is already at the threshold
-        if self.threshold <= schedule_conflict and self.mpq.qsize() == self.max_size:
+        # Don't add the new schedule if the heap is full and it's conflict is already at the threshold
+        if self.threshold <= schedule_conflict + TIE_TOLERANCE and len(self.heap) == self.max_size:
             return
 
-        sch = schedule.copy()   # Make a shallow copy so that the schedule's events are not later rearranged
-        mpq_item = (-1*schedule_conflict, sch)     # multiply conflict by -1 so that the highest-conflict items will be removed first
-        self.mpq.put(mpq_item)
+        # Encode the schedule, so that the schedule's events are not later rearranged.  Skip it if it's already kept.
+        compact = schedule if isinstance(schedule, CompactSchedule) else CompactSchedule.from_schedule(schedule)
+        if compact.key in self.keys:
+            return
+        heap_item = (-1*schedule_conflict, next(self.insertion_count), compact)     # multiply conflict by -1 so that the highest-conflict items will be removed first
 
-        # remove an element if there are now too many
-        if self.mpq.qsize() > self.max_size:
-            self.mpq.get()
+        # replace the highest-conflict element if there would be too many
+        if len(self.heap) == self.max_size:
+            self.keys.discard(heapq.heapreplace(self.heap, heap_item)[2].key)
+        else:
+            heapq.heappush(self.heap, heap_item)
+        self.keys.add(compact.key)
 
         self.update_threshold()     # update the threshold
 
     def update_threshold(self):
         """
         Updates the max conflict threshold for being included in this group
-        This threshold is the max conflict of any schedule in the ScheduleGroup
+        Once the group is full, this threshold is the max conflict of any schedule in the ScheduleGroup
         """
-        sch = self.mpq.get()
-        self.mpq.put(sch)
-        new_threshold = -1*sch[0]
+        if len(self.heap) < self.max_size:
+            return      # any schedule under the initial threshold can still be added
+        new_threshold = -1*self.heap[0][0]      # peek at the highest-conflict schedule
         if new_threshold < self.threshold:
-            print "New Threshold: {}".format(new_threshold)
             self.threshold = new_threshold
+            if self.callback is not None:
+                self.callback('threshold', {'threshold': new_threshold})
+
+    def compact_list(self):
+        """
+        :return: A list of the CompactSchedules in the group, lowest conflict first.  The group is not changed.
+        """
+        # Equal conflicts come out newest first, which is the order the original heap-emptying version returned them in
+        return [item[2] for item in sorted(self.heap, key=lambda item: (-item[0], -item[1]))]
 
     def schedule_list(self):
         """
-        Returns a list of the schedules in the group
-        Warning: This empties the internal priorityqueue
+        Returns a list of the schedules in the group, lowest conflict first, as new Schedule objects.  The group is not changed.
+        """
+        self.schedules = [compact.schedule() for compact in self.compact_list()]
+        return self.schedules
+
+    def results(self):
+        """
+        :return: A ScheduleResults snapshot of the group, for reading conflict reports and exporting
         """
-        schedules = []
-        while not self.mpq.empty():
-            schedules.insert(0, self.mpq.get()[1])
-        self.schedules = schedules
-        return schedules
+        return ScheduleResults(self.schedule_list())
 
     def save_as_csv(self, basename, folder):
         """
@@ -70,79 +115,646 @@ class ScheduleGroup(object):
         :param basename: csv file base. Files will be named basename_option0.csv, basename_option1.csv ...
         :param folder: the folder to save in
         """
-        schedule_list = self.schedule_list()
-        fieldnames = ['Event Name', 'B/C', 'Coach', 'Students']
         print "Writing output to file ..."
-        for index, schedule in enumerate(schedule_list):
-            filename = '{}_option{}.csv'.format(basename, index)
-            filename = os.path.join(folder, filename)
-            with open(filename, 'wb') as outfile:
-                writer = csv.writer(outfile)
-                writer.writerow(['Option {}'.format(index)])
-                writer.writerow(['Conflict Score:', schedule.total_conflict()])
-                writer.writerow([])
-                for index, shift in enumerate(schedule.shifts):
-                    students = shift.students_with_conflicts()
-                    coaches = shift.coaches_with_conflicts()
-                    writer.writerow(['...'])
-                    writer.writerow(['Shift {}:'.format(index)])
-                    writer.writerow(['Conflict Summary:'])
-                    writer.writerow(['Student Conflicts', 'Coach Conflicts', 'Total'])
-                    writer.writerow([len(students), len(coaches), len(students)+len(coaches)])
-                    writer.writerow([])
-                    writer.writerow(['Students with conflicts:'] + students)
-                    writer.writerow(['Coaches with conflicts:'] + coaches)
-                    writer.writerow([])
-                    writer.writerow(fieldnames)
-                    for event in shift.events:
-                        b_or_c = 'C' if event.hs else 'B'
-                        writer.writerow([event.name, event.coach, b_or_c, ', '.join(event.kids)])   # Print schedule
-                    writer.writerow([])
+        for filename in self.results().save_csv(basename, folder):
             print "Finished writing file {}".format(filename)
 
 
-def minimize_conflict(schedule, num_results=constants.NUM_SCHEDULE_OPTIONS):
+class RemainingConflictBound(object):
     """
-    Function that attempts to minimize schedule conflicts using a recursive search algorithm
-    :param schedule: A schedule object to optimize
-    :param num_results: The number of the best schedule options to return
-    :return: A ScheduleGroup object, which is essentially a collection of the best schedules
+    An admissible lower bound on the conflict that the not-yet-scheduled events of a schedule will add.
+    Each unscheduled event adds at least its cheapest insertion cost over all shifts.  Because B/C pairs have negative
+    scores, two unscheduled events may also lower the total by sharing a shift, so every negative score between a pair
+    of unscheduled events is added as well.
     """
-    best_groupings = ScheduleGroup(max_size=num_results)
-    mpq = Queue.PriorityQueue()
-    for event in schedule.events:
-        mpq.put((-1 * event.priority, event))       # Populate the priority queue
+    def __init__(self, schedule):
+        self.schedule = schedule
+        scores = schedule.conflict_table.symmetric_scores
+        self.bonuses = np.minimum(scores, 0)
 
-    def recurse():
-        # Base cases
-        if schedule.total_conflict() > best_groupings.threshold:
-            return
-        if schedule.scheduled_events() == schedule.total_events():
-            best_groupings.put(schedule)
-            print "Possible order found.  " + schedule.status()
+        # 1.0 for each event that is not scheduled yet, 0.0 otherwise.  Kept as floats so the updates below are dot products.
+        self.unscheduled = np.ones(schedule.total_events())
+        for shift in schedule.shifts:
+            self.unscheduled[shift.events] = 0
+
+        # Sum of negative scores between pairs of unscheduled events (each pair appears twice in the symmetric matrix)
+        self.pair_bonus = self.unscheduled.dot(self.bonuses).dot(self.unscheduled) / 2
+
+    def place(self, event_id):
+        """
+        Update the bound for an event that is about to be scheduled
+        """
+        self.unscheduled[event_id] = 0
+        self.pair_bonus -= self.bonuses[event_id].dot(self.unscheduled)
+
+    def unplace(self, event_id):
+        """
+        Update the bound for an event that has been taken back out of the schedule
+        """
+        self.pair_bonus += self.bonuses[event_id].dot(self.unscheduled)
+        self.unscheduled[event_id] = 1
+
+    def value(self):
+        """
+        :return: The lower bound on the conflict still to be added
+        """
+        cheapest = self.schedule.insertion_costs.min(axis=0)
+        return cheapest.dot(self.unscheduled) + self.pair_bonus
+
+
+def branch_shifts(schedule, event_id):
+    """
+    :return: Indices of the shifts that the search tries for event 'event_id', which are the shifts tied for the lowest insertion cost.
+    Shifts are interchangeable, so they are opened in label order: shifts [0, open_shifts) hold events and the first
+    empty shift is the only empty one that is tried.  Each partition of the events into shifts gets exactly one labelling.
+    """
+    open_shifts = schedule.open_shifts()
+    conflicts = schedule.insertion_costs[:open_shifts + 1, event_id].tolist()     # a handful of values, so plain Python is faster than numpy
+    max_tied = min(conflicts) + TIE_TOLERANCE
+    return [index for index, conflict in enumerate(conflicts) if conflict <= max_tied]
+
+
+def event_order(schedule):
+    """
+    :return: A list of the ids of the events that are not yet in any of the schedule's shifts, in the order the search
+             places them: highest priority first, ties broken by event id
+    """
+    scheduled = set()
+    for shift in schedule.shifts:
+        scheduled.update(shift.events)
+    priority = schedule.conflict_table.priority
+    return sorted((event_id for event_id in range(len(priority)) if event_id not in scheduled),
+                  key=lambda event_id: (-priority[event_id], event_id))
+
+
+def dsatur_assignment(schedule, rng=None):
+    """
+    Greedy schedule built most-constrained event first, like DSATUR graph colouring.
+    At each step the unplaced event whose cheapest shift costs the most is placed in that shift.  Ties go to the event
+    with the most conflict with the other unplaced events, then to the higher priority event.
+    :param schedule: A schedule whose non-empty shifts come before its empty ones.  Events already in shifts stay there.
+    :param rng: If given, a numpy RandomState used to break the remaining ties at random instead of by id and shift label
+    :return: An assignment array holding a shift index for every event
+    """
+    scores = schedule.conflict_table.symmetric_scores
+    priority = schedule.conflict_table.priority
+    assignment = schedule.assignment()
+    costs = schedule.insertion_costs.copy()
+    sizes = np.array([shift.num_events() for shift in schedule.shifts])
+    open_shifts = schedule.open_shifts()
+
+    unplaced = np.flatnonzero(assignment < 0)
+    conflicts = np.maximum(scores, 0)
+    degree = conflicts[:, unplaced].sum(axis=1)     # conflict of each event with the events that are still unplaced
+    while len(unplaced):
+        usable = min(open_shifts + 1, len(schedule.shifts))     # shifts are opened in label order, as in the search
+        saturation = costs[:usable, unplaced].min(axis=0)
+        tie_breaker = unplaced if rng is None else rng.rand(len(unplaced))
+        event_id = unplaced[np.lexsort((tie_breaker, -priority[unplaced], -degree[unplaced], -saturation))[0]]
+
+        # Of the cheapest shifts, use the one that raises the cheapest shift cost of the other unplaced events the least,
+        # then the one with the fewest events
+        candidates = costs[:usable, event_id]
+        tied = np.flatnonzero(candidates <= candidates.min() + TIE_TOLERANCE)
+        others = unplaced[unplaced != event_id]
+        damage = np.array([_saturation_increase(costs[:usable, others], index, scores[event_id, others]) for index in tied])
+        tied = tied[damage <= damage.min() + TIE_TOLERANCE]
+        tied = tied[sizes[tied] == sizes[tied].min()]
+        index = tied[0] if rng is None else rng.choice(tied)
+
+        assignment[event_id] = index
+        costs[index] += scores[event_id]
+        sizes[index] += 1
+        open_shifts = max(open_shifts, index + 1)
+        degree -= conflicts[event_id]
+        unplaced = unplaced[unplaced != event_id]
+    return assignment
+
+
+def _saturation_increase(costs, index, added):
+    """
+    :param costs: (shift x event) insertion costs of the unplaced events
+    :param index: The shift an event is about to be added to
+    :param added: The scores the event would add to the unplaced events' costs in that shift
+    :return: The total increase in the unplaced events' cheapest insertion costs
+    """
+    before = costs.min(axis=0)
+    raised = costs.copy()
+    raised[index] += added
+    return (raised.min(axis=0) - before).sum()
+
+
+def warm_start(schedule, best_groupings, attempts=None, seed=0):
+    """
+    Seed a ScheduleGroup with greedy schedules before an exact search, so that its threshold starts at the conflict of
+    good schedules rather than at an arbitrary value
+    :param schedule: The (partially filled) schedule about to be searched.  It is not changed.
+    :param best_groupings: The ScheduleGroup to seed
+    :param attempts: Number of greedy schedules to build: one with DSATUR's own tie-breaking, the rest with random
+           tie-breaking.  Defaults to four per schedule the group can hold.
+    :param seed: Random seed for the randomized attempts
+    """
+    if attempts is None:
+        attempts = 4 * best_groupings.max_size
+    rng = np.random.RandomState(seed)
+    seen = set()
+    for attempt in range(attempts):
+        assignment = dsatur_assignment(schedule, rng if attempt else None)
+        key = assignment_key(assignment)
+        if key in seen:
+            continue
+        seen.add(key)
+        greedy = Schedule(schedule.events, conflict_table=schedule.conflict_table, num_shifts=len(schedule.shifts))
+        greedy.add_assignment(assignment)
+        best_groupings.put(greedy)
+
+
+class TranspositionTable(object):
+    """
+    A bounded cache of lower bounds on the conflict that completing a partial schedule can add.
+    Entries are kept in two generations of at most max_entries / 2 each.  When the newer one fills up, the older one
+    is dropped, so entries that haven't been used since the last turnover are evicted first (an approximate LRU that
+    only uses plain dicts).
+    """
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.recent = {}
+        self.older = {}
+        self.hits = 0       # number of lookups that found an entry
+
+    def __len__(self):
+        return len(self.recent) + len(self.older)
+
+    def get(self, key):
+        """
+        :return: The stored bound for key, or None
+        """
+        future = self.recent.get(key)
+        if future is None:
+            future = self.older.pop(key, None)
+            if future is None:
+                return None
+            self._insert(key, future)       # move to the recent generation
+        self.hits += 1
+        return future
+
+    def store(self, key, future):
+        """
+        Store a lower bound on the conflict that completing the partial schedule identified by key can add
+        """
+        old_future = self.recent.get(key)
+        if old_future is None:
+            old_future = self.older.pop(key, None)
+        if old_future is not None:
+            future = max(future, old_future)
+        self._insert(key, future)
+
+    def _insert(self, key, future):
+        if key not in self.recent and len(self.recent) >= self.max_entries // 2:
+            self.older = self.recent
+            self.recent = {}
+        self.recent[key] = future
+
+
+class SearchKeys(object):
+    """
+    Order-independent Zobrist keys for the partial schedules of a search with a fixed event order.
+    Once every event that shares a non-zero score with an event has been placed, that event can no longer change the
+    cost of placing anything else.  Two partial schedules at the same depth that agree on the remaining ("live") events
+    have the same completions, with the same added conflict, even if they differ in where earlier events went.
+    Each shift's hash is the XOR of the codes of the live events in it, and is updated as events are placed and die.
+    """
+    def __init__(self, schedule, order, seed=0):
+        """
+        :param schedule: The schedule being searched
+        :param order: The order in which the search places events
+        """
+        scores = schedule.conflict_table.symmetric_scores[np.ix_(order, order)]
+        np.fill_diagonal(scores, 0)
+        positions = np.arange(len(order))
+
+        # last_neighbour[i] is the last position in the order whose event shares a score with the event at position i
+        last_neighbour = np.where(scores != 0, positions[None, :], -1).max(axis=1)
+
+        # toggles[depth] holds the positions whose hash changes when the event at 'depth' is placed: that event, if it
+        # stays live, and the earlier events that die because it was their last neighbour
+        self.toggles = [([depth] if last_neighbour[depth] > depth else []) +
+                        positions[:depth][last_neighbour[:depth] == depth].tolist() for depth in range(len(order))]
+        # Before this depth no event has died, so no two partial schedules are equivalent and lookups can't hit
+        self.first_depth = min(last_neighbour.min() + 1, len(order))
+        rng = np.random.RandomState(seed)
+        self.codes = rng.randint(1, 2**62, size=len(order)).tolist()
+        self.placed = [0]*len(order)        # placed[i] is the shift index of the event at position i, once placed
+        self.hashes = [0]*len(schedule.shifts)
+
+    def place(self, depth, index):
+        """
+        Update the hashes for the event at position 'depth' of the order being placed in shift 'index'
+        """
+        self.placed[depth] = index
+        for position in self.toggles[depth]:
+            self.hashes[self.placed[position]] ^= self.codes[position]
+
+    def unplace(self, depth):
+        """
+        Undo place(depth, index)
+        """
+        for position in self.toggles[depth]:
+            self.hashes[self.placed[position]] ^= self.codes[position]
+
+    def key(self, depth, open_shifts):
+        """
+        :return: A key for the current partial schedule after the first 'depth' events, with open_shifts non-empty shifts.
+                 It doesn't depend on the shift labels.
+        """
+        return depth, tuple(sorted(self.hashes[:open_shifts]))
+
+
+class ConflictSearch(object):
+    """
+    One run of the conflict search, with an optional time or node budget.
+    The search is a depth-first walk over the events in a fixed order, driven by an explicit stack with one record per
+    depth: the shifts to try for that depth's event, how many have been tried, and the shift the event is in now (which
+    is what has to be undone to backtrack).  There is no recursion, so any number of events can be searched.
+    improvements() yields each new best schedule as soon as it is found.  If the budget runs out, the search pauses
+    cleanly and the schedules found so far stay in the ScheduleGroup.  A paused search continues where it left off when
+    it is run again, or it can be saved with save_checkpoint and continued in a later process with resume_search.
+    """
+    # How many nodes to expand between checks of the clock
+    CLOCK_CHECK_INTERVAL = 1000
+
+    # Bump this when the checkpoint contents change
+    CHECKPOINT_VERSION = 2
+
+    def __init__(self, schedule, best_groupings, bound=None, time_limit=None, max_nodes=None, transposition_table=None,
+                 stats=None):
+        """
+        :param schedule: A partially filled schedule whose non-empty shifts come before its empty ones (see Schedule.sort_shifts).
+               It is returned to its original state when the search finishes or pauses.
+        :param best_groupings: The ScheduleGroup to fill.  Its threshold is used for pruning.
+        :param bound: An optional RemainingConflictBound for the schedule
+        :param time_limit: Pause after this many seconds of each run
+        :param max_nodes: Pause after expanding this many nodes in each run
+        :param transposition_table: An optional TranspositionTable.  Partial schedules that are equivalent to one that was
+               already searched are pruned if the bound stored for it shows they can't beat the threshold.
+        :param stats: An optional SearchStats to collect counters in and send progress events to
+        """
+        self.schedule = schedule
+        self.best_groupings = best_groupings
+        self.bound = bound
+        self.order = event_order(schedule)      # the variable ordering is static, so it is computed once
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.deadline = None
+
+        self.nodes = 0
+        self.stopped = False        # True if the budget ran out before the search finished
+        self.finished = False       # True once the whole tree has been searched
+        self.best_conflict = float('inf')
+
+        self.stats = stats
+        self.table = transposition_table
+        self.keys = SearchKeys(schedule, self.order) if transposition_table is not None else None
+        self.subtree_bound = float('inf')    # lowest lower bound on the conflict of any completion of the current node
+
+        # The search stack, preallocated with one record per depth
+        stack_size = len(self.order) + 1
+        self.branches = [None]*stack_size       # shift indices to try for the event at each depth (see branch_shifts)
+        self.tried = [0]*stack_size             # how many of them have been tried
+        self.placed = [0]*stack_size            # the shift the event is in now, once tried > 0
+        self.node_conflicts = [0.0]*stack_size  # conflict of the partial schedule at each open node
+        self.node_keys = [None]*stack_size      # transposition table key of each open node, if its bound is to be stored
+        self.outer_bounds = [0.0]*stack_size    # subtree_bound of the enclosing nodes, saved while a keyed node is open
+        self.resume_depth = 0                   # depth of the node to enter next; the stack below it is open
+
+    def run(self):
+        """
+        Run the search to completion or until the budget runs out
+        :return: The ScheduleGroup of the best schedules found
+        """
+        for schedule in self.improvements():
+            pass
+        return self.best_groupings
+
+    def improvements(self):
+        """
+        Generator that runs the search, yielding a copy of each schedule that beats every schedule found before it.
+        If the search was paused, it continues from where it stopped, with a fresh time and node budget.  If it has
+        already finished, nothing more is searched.
+        best_groupings.search_complete is set if the search walks its whole tree within its budget.  The tree only
+        branches on the shifts tied for each event's cheapest insertion, so a complete search can still miss the optimum.
+        """
+        self.nodes = 0
+        if self.finished:
+            self.best_groupings.search_complete = True
             return
+        self.deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        if self.stopped:
+            self._replay()
+        with timed_phase(self.stats, 'search'):
+            for schedule in self._search():
+                yield schedule
+        self.best_groupings.search_complete = not self.stopped
 
-        # Dequeue next event
-        priority, event = mpq.get()
-        conflicts = [shift.event_conflicts(event) for shift in schedule.shifts]
-        min_conflict = min(conflicts)
-
-        starter = False
-        for index, conflict in enumerate(conflicts):
-            if conflict == min_conflict:
-                shift = schedule.shifts[index]
-                if shift.num_events() == 0:
-                    if starter:  # continue if this element has already started its own shift
-                        continue
+    def _out_of_budget(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            self.stopped = True
+        elif self.deadline is not None and self.nodes % self.CLOCK_CHECK_INTERVAL == 0 and time.time() > self.deadline:
+            self.stopped = True
+        return self.stopped
+
+    def _record_node(self, depth):
+        stats = self.stats
+        stats.nodes += 1
+        stats.depth_histogram[depth] += 1
+        if stats.nodes % stats.progress_interval == 0:
+            stats.emit('progress', nodes=stats.nodes, elapsed=time.time() - stats.start_time)
+
+    def _search(self):
+        """
+        Walk the search tree from the node at resume_depth, below the open nodes on the stack.
+        Each pass of the loop enters one node, prunes it or records it as a leaf or expands it, then backtracks to the
+        deepest open node that has a shift left to try and places its event there.
+        """
+        schedule = self.schedule
+        best_groupings = self.best_groupings
+        bound = self.bound
+        stats = self.stats
+        table = self.table
+        keys = self.keys
+        order = self.order
+        num_events = len(order)
+        branches = self.branches
+        tried = self.tried
+        placed = self.placed
+
+        depth = self.resume_depth
+        while True:
+            # Enter the node at 'depth', where the first 'depth' events of the order are placed
+            if self._out_of_budget():
+                self._pause(depth)
+                return
+            if stats is not None:
+                self._record_node(depth)
+            conflict = schedule.total_conflict()
+            expand = False
+            key = None
+            # B/C pairs still to be placed can lower the conflict, so inner nodes are only pruned on the conflict so far
+            # when there is no bound to prune them with
+            if (depth == num_events or bound is None) and conflict > best_groupings.threshold + TIE_TOLERANCE:
+                if stats is not None:
+                    stats.prunes['threshold'] += 1
+                self.subtree_bound = min(self.subtree_bound, conflict)
+            elif depth == num_events:
+                self.subtree_bound = min(self.subtree_bound, conflict)
+                best_groupings.put(schedule)
+                if stats is not None:
+                    stats.leaves += 1
+                    stats.emit('schedule_found', conflict=conflict, schedule=schedule)
+                if conflict < self.best_conflict - TIE_TOLERANCE:
+                    self.best_conflict = conflict
+                    if stats is not None:
+                        stats.emit('improvement', conflict=conflict)
+                    yield schedule.copy()
+            else:
+                lower_bound = conflict + bound.value() if bound is not None else conflict
+                if lower_bound > best_groupings.threshold + TIE_TOLERANCE:
+                    if stats is not None:
+                        stats.prunes['bound'] += 1
+                    self.subtree_bound = min(self.subtree_bound, lower_bound)
+                elif table is not None and depth >= keys.first_depth:
+                    key = keys.key(depth, schedule.open_shifts())
+                    future = table.get(key)
+                    if future is not None and conflict + future > best_groupings.threshold + TIE_TOLERANCE:
+                        if stats is not None:
+                            stats.prunes['transposition'] += 1
+                        self.subtree_bound = min(self.subtree_bound, conflict + future)
                     else:
-                        starter = True
-                shift.add_event(event)
-                recurse()       # call recursively
-                shift.remove_event(event)
-        mpq.put((priority, event))
-
-    recurse()
-    print "Finished optimizing schedules."
+                        expand = True
+                        self.outer_bounds[depth] = self.subtree_bound
+                        self.subtree_bound = float('inf')
+                else:
+                    expand = True
+
+            if expand:
+                # Push a record for the next event
+                event = order[depth]
+                if bound is not None:
+                    bound.place(event)
+                branches[depth] = branch_shifts(schedule, event)
+                tried[depth] = 0
+                self.node_conflicts[depth] = conflict
+                self.node_keys[depth] = key
+            else:
+                depth -= 1
+
+            # Backtrack to the deepest open node with a shift left to try
+            while depth >= 0:
+                event = order[depth]
+                if tried[depth]:
+                    if keys is not None:
+                        keys.unplace(depth)
+                    schedule.shifts[placed[depth]].remove_event(event)
+                if tried[depth] < len(branches[depth]):
+                    index = branches[depth][tried[depth]]
+                    tried[depth] += 1
+                    placed[depth] = index
+                    schedule.shifts[index].add_event(event)
+                    if keys is not None:
+                        keys.place(depth, index)
+                    depth += 1
+                    break
+
+                # Every shift has been tried: pop the record
+                if bound is not None:
+                    bound.unplace(event)
+                key = self.node_keys[depth]
+                if key is not None:
+                    # Every completion below this node was either found or cut off at a node whose lower bound was
+                    # recorded, so an equivalent partial schedule can't add less than this
+                    table.store(key, self.subtree_bound - self.node_conflicts[depth])
+                    self.subtree_bound = min(self.outer_bounds[depth], self.subtree_bound)
+                depth -= 1
+            else:
+                self.resume_depth = 0
+                self.finished = True
+                return
+
+    def _pause(self, depth):
+        """
+        Take the placed events back out of the schedule, keeping the stack so that the search can continue at 'depth'
+        """
+        self.resume_depth = depth
+        for open_depth in reversed(range(depth)):
+            event = self.order[open_depth]
+            if self.keys is not None:
+                self.keys.unplace(open_depth)
+            self.schedule.shifts[self.placed[open_depth]].remove_event(event)
+            if self.bound is not None:
+                self.bound.unplace(event)
+            if self.node_keys[open_depth] is not None:
+                self.subtree_bound = min(self.outer_bounds[open_depth], self.subtree_bound)
+                # Part of this node's subtree was searched before the pause and isn't counted in the bound found after
+                # it, so the node's bound is never stored
+                self.node_keys[open_depth] = None
+
+    def _replay(self):
+        """
+        Put the events of the open stack records back into the schedule, to continue a paused search
+        """
+        for depth in range(self.resume_depth):
+            event = self.order[depth]
+            if self.bound is not None:
+                self.bound.place(event)
+            self.schedule.shifts[self.placed[depth]].add_event(event)
+            if self.keys is not None:
+                self.keys.place(depth, self.placed[depth])
+        self.stopped = False
+
+    def checkpoint(self):
+        """
+        :return: A picklable dict holding everything needed to continue this paused search in another process:
+                 the open stack records and the schedules found so far.  The conflict table is not included, but its
+                 roster key and weights are, so that the checkpoint can't be resumed against a different table.
+        """
+        depth = self.resume_depth
+        group = self.best_groupings
+        conflict_table = self.schedule.conflict_table
+        return {'version': self.CHECKPOINT_VERSION,
+                'roster_key': conflict_cache_key(conflict_table.roster),
+                'weights': conflict_table.weights.as_dict(),
+                'order': list(self.order),
+                'assignment': self.schedule.assignment(),
+                'num_shifts': len(self.schedule.shifts),
+                'finished': self.finished,
+                'resume_depth': depth,
+                'branches': self.branches[:depth],
+                'tried': self.tried[:depth],
+                'placed': self.placed[:depth],
+                'best_conflict': self.best_conflict,
+                'max_size': group.max_size,
+                'initial_threshold': group.initial_threshold,
+                'results': [(compact.assignment, compact.order, compact.conflict) for compact in group.compact_list()],
+                'prune_with_bound': self.bound is not None,
+                'transposition_table_size': self.table.max_entries if self.table is not None else None}
+
+    def save_checkpoint(self, filename):
+        """
+        Save checkpoint() to a file.  The file is written under a temporary name and renamed when complete.
+        """
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as outfile:
+            pickle.dump(self.checkpoint(), outfile, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_filename, filename)
+
+    def restore(self, checkpoint):
+        """
+        Continue from a checkpoint taken of a search over the same schedule.  The next run picks up where it paused.
+        """
+        if checkpoint['version'] != self.CHECKPOINT_VERSION:
+            raise ValueError("checkpoint version {} can't be read".format(checkpoint['version']))
+        conflict_table = self.schedule.conflict_table
+        if checkpoint['roster_key'] != conflict_cache_key(conflict_table.roster) or \
+                checkpoint['weights'] != conflict_table.weights.as_dict():
+            raise ValueError("checkpoint was taken of a search with a different roster, custom conflict factors or weights")
+        if checkpoint['order'] != list(self.order) or len(checkpoint['order']) != self.schedule.total_events() or \
+                not np.array_equal(checkpoint['assignment'], self.schedule.assignment()):
+            raise ValueError("checkpoint was taken of a search over a different schedule")
+        depth = checkpoint['resume_depth']
+        self.resume_depth = depth
+        self.branches[:depth] = checkpoint['branches']
+        self.tried[:depth] = checkpoint['tried']
+        self.placed[:depth] = checkpoint['placed']
+        self.node_keys[:depth] = [None]*depth
+        self.best_conflict = checkpoint['best_conflict']
+        self.finished = checkpoint['finished']
+        self.stopped = not self.finished
+        for assignment, order, conflict in checkpoint['results']:
+            self.best_groupings.put(CompactSchedule(self.schedule.conflict_table, assignment, order,
+                                                    len(self.schedule.shifts), conflict))
+        self.best_groupings.search_complete = checkpoint['finished']
+
+
+def minimize_conflict(schedule, num_results=constants.NUM_SCHEDULE_OPTIONS, prune_with_bound=True, time_limit=None,
+                      max_nodes=None, seed_with_greedy=True, transposition_table_size=None, stats=None):
+    """
+    Function that attempts to minimize schedule conflicts using a depth-first branch and bound search (see ConflictSearch)
+    :param schedule: A schedule object to optimize
+    :param num_results: The number of the best schedule options to return
+    :param prune_with_bound: If True, also prune partial schedules whose conflict plus a lower bound on the conflict of the
+           remaining events already exceeds the threshold.  This only skips schedules that could not have been kept.
+    :param time_limit: If given, stop after this many seconds and return the best schedules found so far
+    :param max_nodes: If given, stop after expanding this many search nodes and return the best schedules found so far
+    :param seed_with_greedy: If True, seed the results and the pruning threshold with greedy schedules before searching (see warm_start)
+    :param transposition_table_size: If given, remember lower bounds for up to this many partial schedules and skip
+           partial schedules that are equivalent to one already searched (see TranspositionTable and SearchKeys)
+    :param stats: An optional SearchStats that collects node and prune counts and phase times, and passes progress
+           events to its callback.  Without one the search runs silently.
+    :return: A ScheduleGroup object, which is essentially a collection of the best schedules.
+             Its search_complete attribute is False if the search was stopped early.  True means the search finished,
+             not that the schedules are proven optimal (see ConflictSearch.improvements).
+    """
+    search = start_search(schedule, num_results, prune_with_bound, time_limit, max_nodes, seed_with_greedy,
+                          transposition_table_size, stats)
+    best_groupings = search.run()
+    if stats is not None:
+        stats.emit('finished', search_complete=best_groupings.search_complete)
     return best_groupings
 
 
+def start_search(schedule, num_results=constants.NUM_SCHEDULE_OPTIONS, prune_with_bound=True, time_limit=None,
+                 max_nodes=None, seed_with_greedy=True, transposition_table_size=None, stats=None):
+    """
+    Set up a ConflictSearch over a whole schedule.  Parameters are the same as for minimize_conflict.
+    :return: A ConflictSearch.  Call run() to search, or iterate over improvements() to stream results:
+        search = start_search(schedule, time_limit=60)
+        for improved in search.improvements():
+            print improved.status()
+        results = search.best_groupings
+    """
+    best_groupings = ScheduleGroup(max_size=num_results, callback=stats.callback if stats is not None else None)
+    schedule.sort_shifts()      # the search relies on non-empty shifts coming first
+    if seed_with_greedy:
+        with timed_phase(stats, 'warm start'):
+            warm_start(schedule, best_groupings)
+    with timed_phase(stats, 'setup'):
+        bound = RemainingConflictBound(schedule) if prune_with_bound else None
+        table = TranspositionTable(transposition_table_size) if transposition_table_size else None
+        search = ConflictSearch(schedule, best_groupings, bound, time_limit=time_limit, max_nodes=max_nodes,
+                                transposition_table=table, stats=stats)
+    return search
+
+
+def resume_search(schedule, checkpoint_file, time_limit=None, max_nodes=None, stats=None):
+    """
+    Continue a search that was saved with ConflictSearch.save_checkpoint, e.g. after its time limit ran out:
+        search = start_search(schedule, time_limit=3600)
+        results = search.run()
+        if not results.search_complete:
+            search.save_checkpoint('search.ckpt')
+        ...
+        results = resume_search(schedule, 'search.ckpt', time_limit=3600).run()
+    :param schedule: The schedule the search was started on, in the same state (same roster, weights, shift count and
+           pre-placed events)
+    :param checkpoint_file: The checkpoint file name
+    :param time_limit: Time limit in seconds for the next run
+    :param max_nodes: Node limit for the next run
+    :param stats: An optional SearchStats for the next run
+    :return: A ConflictSearch that continues where the saved one paused.  Its ScheduleGroup holds the schedules found
+             before the checkpoint.
+    """
+    with open(checkpoint_file, 'rb') as infile:
+        checkpoint = pickle.load(infile)
+    if checkpoint['num_shifts'] != len(schedule.shifts):
+        raise ValueError("checkpoint was taken of a search with {} shifts".format(checkpoint['num_shifts']))
+    best_groupings = ScheduleGroup(max_size=checkpoint['max_size'], initial_threshold=checkpoint['initial_threshold'],
+                                   callback=stats.callback if stats is not None else None)
+    schedule.sort_shifts()      # as start_search does
+    bound = RemainingConflictBound(schedule) if checkpoint['prune_with_bound'] else None
+    table_size = checkpoint['transposition_table_size']
+    table = TranspositionTable(table_size) if table_size else None
+    search = ConflictSearch(schedule, best_groupings, bound, time_limit=time_limit, max_nodes=max_nodes,
+                            transposition_table=table, stats=stats)
+    search.restore(checkpoint)
+    return search
@@ -0,0 +1,165 @@
+import multiprocessing
+import constants
+from optimization import ScheduleGroup, ConflictSearch, RemainingConflictBound, TIE_TOLERANCE, branch_shifts, event_order, \
+    warm_start
+from schedule_components import CompactSchedule
+from instrumentation import timed_phase
+from worker_pool import pool_map
+
+
+class SharedScheduleGroup(ScheduleGroup):
+    """
+    A ScheduleGroup whose threshold is shared with other processes through a multiprocessing.Array('d').
+    The group prunes against the lower of its own threshold and its entry of the array, and publishes a lower threshold
+    to its entry and every later one.
+    In a parallel search every worker uses entry 0: the worst conflict kept by any one worker bounds the worst conflict
+    of the merged results.  In minimum_shift_search entry i belongs to the i-th shift count: a schedule with fewer
+    shifts is also a schedule with more shifts (the extra shifts stay empty), so each count's best conflict bounds every
+    larger count.
+    """
+    def __init__(self, shared_thresholds, index=0, max_size=5, initial_threshold=None):
+        """
+        :param shared_thresholds: A multiprocessing.Array('d') shared by all processes.  Each entry is kept at or below
+               every entry before it.
+        :param index: This group's entry
+        """
+        self.shared_thresholds = shared_thresholds
+        self.shared_values = shared_thresholds.get_obj()     # unlocked view for reads; a double is read atomically
+        self.index = index
+        ScheduleGroup.__init__(self, max_size=max_size, initial_threshold=initial_threshold)
+
+    @property
+    def threshold(self):
+        return min(self._threshold, self.shared_values[self.index])
+
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = value
+        if value < self.shared_values[self.index]:
+            with self.shared_thresholds.get_lock():
+                for index in range(self.index, len(self.shared_values)):
+                    self.shared_values[index] = min(self.shared_values[index], value)
+
+
+def split_search(schedule, min_subproblems, bound=None, threshold=float('inf')):
+    """
+    Expand the first levels of the search tree breadth-first until there are at least min_subproblems partial schedules
+    :param schedule: The schedule to split.  It is returned to its original state.
+    :param min_subproblems: Stop expanding once there are this many subproblems (or no events are left to place)
+    :param bound: An optional RemainingConflictBound used to drop subproblems that can't beat the threshold
+    :param threshold: The initial threshold of the search
+    :return: A list of subproblems, each a list of (event id, shift index) placements, in search order
+    """
+    prefixes = [[]]
+    for event in event_order(schedule):
+        if len(prefixes) >= min_subproblems:
+            break
+        expanded = []
+        for prefix in prefixes:
+            for index in _branches(schedule, prefix, event, bound, threshold):
+                expanded.append(prefix + [(event, index)])
+        prefixes = expanded
+    return prefixes
+
+
+def _branches(schedule, prefix, event, bound, threshold):
+    """
+    :return: The shift indices the search would try for 'event' after the placements in prefix, minus any that are pruned
+    """
+    _place(schedule, prefix, bound)
+    branches = []
+    for index in branch_shifts(schedule, event):
+        placement = [(event, index)]
+        _place(schedule, placement, bound)
+        lower_bound = schedule.total_conflict() + (bound.value() if bound is not None else 0)
+        if lower_bound <= threshold + TIE_TOLERANCE:
+            branches.append(index)
+        _unplace(schedule, placement, bound)
+    _unplace(schedule, prefix, bound)
+    return branches
+
+
+def _place(schedule, prefix, bound):
+    for event, index in prefix:
+        schedule.shifts[index].add_event(event)
+        if bound is not None:
+            bound.place(event)
+
+
+def _unplace(schedule, prefix, bound):
+    for event, index in reversed(prefix):
+        schedule.shifts[index].remove_event(event)
+        if bound is not None:
+            bound.unplace(event)
+
+
+def _solve_subproblem(prefix, schedule, shared_thresholds, num_results, prune_with_bound):
+    """
+    Search the subtree below one prefix in a pool worker
+    :return: (a list of (assignment, order, conflict) for the schedules the worker kept (see CompactSchedule), nodes)
+    """
+    bound = RemainingConflictBound(schedule) if prune_with_bound else None
+    best_groupings = SharedScheduleGroup(shared_thresholds, max_size=num_results)
+
+    _place(schedule, prefix, bound)
+    search = ConflictSearch(schedule, best_groupings, bound)
+    search.run()
+    _unplace(schedule, prefix, bound)
+
+    # Send back only the arrays; the conflict table stays in the parent
+    return [(compact.assignment, compact.order, compact.conflict) for compact in best_groupings.compact_list()], search.nodes
+
+
+def parallel_minimize_conflict(schedule, num_results=constants.NUM_SCHEDULE_OPTIONS, processes=None,
+                               min_subproblems=None, prune_with_bound=True, seed_with_greedy=True, stats=None):
+    """
+    Parallel version of minimize_conflict.
+    The first levels of the search tree are split into independent subproblems that are searched on a process pool.
+    Workers share the best known threshold, so pruning in one worker helps all of them, and their results are merged
+    into one ScheduleGroup.
+    Note: without prune_with_bound, pruning partial schedules whose conflict is already over the threshold is a
+    heuristic, since later B/C pairs can still lower the conflict.  Workers lower the threshold in a different order than the serial search does, so
+    which near-optimal schedules survive can differ from minimize_conflict.
+    :param schedule: A schedule object to optimize
+    :param num_results: The number of the best schedule options to return
+    :param processes: Number of worker processes.  Defaults to the number of CPUs.
+    :param min_subproblems: Minimum number of subproblems to split the search into.  Defaults to 8 per process.
+    :param prune_with_bound: If True, prune with a lower bound on the conflict of the remaining events (see minimize_conflict)
+    :param seed_with_greedy: If True, seed the results and the shared threshold with greedy schedules (see warm_start)
+    :param stats: An optional SearchStats.  It gets the phase times, the workers' total node count and the 'split',
+           'threshold' and 'finished' events (see SearchStats).  Without one the search runs silently.
+    :return: A ScheduleGroup object holding the best schedules found by all workers.  Its search_complete attribute is
+             True once every subproblem has been searched (see ConflictSearch.improvements).
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if min_subproblems is None:
+        min_subproblems = 8 * processes
+
+    best_groupings = ScheduleGroup(max_size=num_results, callback=stats.callback if stats is not None else None)
+    schedule.sort_shifts()      # the search relies on non-empty shifts coming first
+    if seed_with_greedy:
+        with timed_phase(stats, 'warm start'):
+            warm_start(schedule, best_groupings)
+    with timed_phase(stats, 'setup'):
+        bound = RemainingConflictBound(schedule) if prune_with_bound else None
+        prefixes = split_search(schedule, min_subproblems, bound, best_groupings.threshold)
+    if stats is not None:
+        stats.emit('split', subproblems=len(prefixes), processes=processes)
+
+    shared_thresholds = multiprocessing.Array('d', [best_groupings.threshold])
+    with timed_phase(stats, 'search'):
+        for results, nodes in pool_map(_solve_subproblem, prefixes,
+                                       (schedule, shared_thresholds, num_results, prune_with_bound), processes,
+                                       ordered=False):
+            for assignment, order, conflict in results:
+                best_groupings.put(CompactSchedule(schedule.conflict_table, assignment, order, len(schedule.shifts),
+                                                   conflict))
+            if stats is not None:
+                stats.nodes += nodes
+    best_groupings.search_complete = True       # the workers have no budget, so every subproblem was searched to the end
+
+    if stats is not None:
+        stats.emit('finished', search_complete=True)
+    return best_groupings
+
@@ -0,0 +1,109 @@
+import numpy as np
+
+try:
+    import scipy.sparse as sparse
+except ImportError:     # scipy is optional; fall back to a dense incidence matrix
+    sparse = None
+
+
+class Roster(object):
+    """
+    An array-backed collection of events.
+    Events, kids and coaches are interned to dense integer ids so that the conflict table, shifts and search
+    can work on ints only.  Names are looked up through the roster when output is written.
+    """
+    def __init__(self, events):
+        """
+        :param events: An iterable of Event objects, e.g. a generator streaming them from a file.  Each event's id is
+               set to its position in the roster.  Everything is interned in a single pass over the events.
+        """
+        self.events = []
+        self.event_index = {}       # (name, hs) -> event id
+        name_index = {}
+        kid_index = {}
+        coach_index = {}
+        hs = []
+        sizes = []
+        build_events = []
+        name_ids = []
+        coach_ids = []
+        kid_indices = []
+        kid_indptr = [0]
+        for event in events:
+            event.id = len(self.events)
+            self.events.append(event)
+            self.event_index[(event.name, event.hs)] = event.id
+            hs.append(event.hs)
+            sizes.append(len(event.kids))
+            build_events.append(event.build_event)
+
+            # Event names are interned too, so B/C counterparts can be found by comparing ids
+            name_ids.append(name_index.setdefault(event.name, len(name_index)))
+            coach_ids.append(-1 if event.coach is None else coach_index.setdefault(event.coach, len(coach_index)))
+
+            # A kid listed twice in one event still only counts once
+            kid_indices.extend(sorted(set(kid_index.setdefault(kid, len(kid_index)) for kid in event.kids)))
+            kid_indptr.append(len(kid_indices))
+
+        self.num_events = len(self.events)
+        self.hs = np.array(hs, dtype=bool)
+        self.sizes = np.array(sizes, dtype=int)
+        self.build_events = np.array(build_events, dtype=bool)
+        self.name_ids = np.array(name_ids, dtype=int)
+        self.event_names = sorted(name_index, key=name_index.get)
+
+        # coach_ids[i] is the coach id for event i, or -1 if the event has no coach
+        self.coach_ids = np.array(coach_ids, dtype=int)
+        self.coach_names = sorted(coach_index, key=coach_index.get)
+
+        # The kids of event i are kid_indices[kid_indptr[i]:kid_indptr[i+1]], in CSR layout.  kid_ids[i] is a view of
+        # that slice.
+        self.kid_names = sorted(kid_index, key=kid_index.get)
+        self.kid_indices = np.array(kid_indices, dtype=int)
+        self.kid_indptr = np.array(kid_indptr, dtype=int)
+        self.kid_ids = [self.kid_indices[start:end] for start, end in zip(kid_indptr[:-1], kid_indptr[1:])]
+        self._kid_incidence = None
+
+    def __len__(self):
+        return self.num_events
+
+    def __getitem__(self, event_id):
+        return self.events[event_id]
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def index(self, event):
+        """
+        :param event: An Event object or an integer event id
+        :return: The integer id of the event
+        """
+        if hasattr(event, 'name'):
+            return self.event_index[(event.name, event.hs)]
+        return event
+
+    def priorities(self, weights):
+        """
+        :param weights: A Weights object
+        :return: An array of each event's search priority under the given weights: size_factor per kid, plus
+                 build_event_factor for build events
+        """
+        # Note: this may need to be adjusted by adding a parameter that covers whether the event has a MS or HS counterpart that it could be paired with
+        return weights.size_factor * self.sizes + weights.build_event_factor * self.build_events
+
+    @property
+    def kid_incidence(self):
+        """
+        The binary (event x kid) incidence matrix, built the first time it is needed
+        :return: a scipy.sparse CSR matrix, or a dense numpy array if scipy is not installed
+        """
+        if self._kid_incidence is None:
+            shape = (self.num_events, len(self.kid_names))
+            if sparse is not None:
+                self._kid_incidence = sparse.csr_matrix((np.ones(len(self.kid_indices)), self.kid_indices,
+                                                         self.kid_indptr), shape=shape)
+            else:
+                self._kid_incidence = np.zeros(shape)
+                self._kid_incidence[np.repeat(np.arange(self.num_events), np.diff(self.kid_indptr)),
+                                    self.kid_indices] = 1
+        return self._kid_incidence
@@ -1,4 +1,5 @@
 import copy
+import numpy as np
 import constants
 from conflict import ConflictTable
 
@@ -10,20 +11,68 @@ class Schedule(object):
     def __init__(self, events, shifts=None, conflict_table=None, num_shifts=4):
         """
         Creates a 'schedule' object from a list of events
-        :param events: A list of events to be scheduled
+        :param events: A Roster or list of events to be scheduled
         :param shifts: A list of pre-filled shifts (empty shifts will be created if this parameter is not passed)
         :param conflict_table: A conflict table. Will be generated based on events if not passed.
         :param num_shifts: The number of science olympiad shifts to schedule.
         """
-        self.events = events
         self.shifts = shifts
         self.conflict_table = conflict_table
 
         # Create conflict table and shifts if not passed as parameters
         if conflict_table is None:
             self.conflict_table = ConflictTable(events)
+        self.events = self.conflict_table.roster     # events are referred to by their integer id in this roster
         if shifts is None:
             self.shifts = [Shift(self.conflict_table) for i in range(num_shifts)]
+        self._stack_insertion_costs()
+
+    def _stack_insertion_costs(self):
+        """
+        Stack the shifts' insertion cost vectors into one (shift x event) matrix, so the cost of adding
+        an event to every shift is a single column lookup
+        """
+        self.insertion_costs = np.array([shift.insertion_costs for shift in self.shifts])
+        for index, shift in enumerate(self.shifts):
+            shift.insertion_costs = self.insertion_costs[index]
+
+    def sort_shifts(self):
+        """
+        Reorder the shifts so that shifts holding events come before empty ones.
+        Shifts are interchangeable, so this does not change the schedule.
+        """
+        self.shifts.sort(key=lambda shift: shift.num_events() == 0)
+        self._stack_insertion_costs()
+
+    def open_shifts(self):
+        """
+        :return: The number of shifts that hold at least one event
+        """
+        return sum(1 for shift in self.shifts if shift.events)
+
+    def assignment(self):
+        """
+        :return: An array holding the index of the shift each event is in, or -1 for events that are not scheduled
+        """
+        assignment = np.full(self.total_events(), -1, dtype=int)
+        for index, shift in enumerate(self.shifts):
+            assignment[shift.events] = index
+        return assignment
+
+    def add_assignment(self, assignment):
+        """
+        Add events to shifts according to an assignment array
+        :param assignment: An array holding the shift index for each event id, or -1 for events to leave out
+        """
+        for event_id, index in enumerate(assignment):
+            if index >= 0:
+                self.shifts[index].add_event(event_id)
+
+    def event_conflicts(self, event_id):
+        """
+        :return: An array holding the conflict score increase that would result from adding event 'event_id' to each shift
+        """
+        return self.insertion_costs[:, event_id].copy()    # copy, since the shifts' vectors change as events are added
 
     def total_conflict(self):
         """
@@ -58,9 +107,71 @@ class Schedule(object):
         return schedule_copy
 
 
+def canonical_assignment(assignment):
+    """
+    Relabel the shifts of an assignment in order of first appearance, so that any two assignments that put the same
+    events together give the same array, whatever the shift labels
+    :param assignment: An array holding the shift index of each event, or -1 for events that are not scheduled
+    :return: The relabelled assignment, as an int16 array
+    """
+    assignment = np.asarray(assignment)
+    placed = assignment >= 0
+    labels, first = np.unique(assignment[placed], return_index=True)
+    relabel = np.zeros(labels[-1] + 1 if len(labels) else 0, dtype=np.int16)
+    relabel[labels[np.argsort(first)]] = np.arange(len(labels))
+    canonical = np.full(len(assignment), -1, dtype=np.int16)
+    canonical[placed] = relabel[assignment[placed]]
+    return canonical
+
+
+def assignment_key(assignment):
+    """
+    :return: A hashable key that is the same for any two assignments that put the same events together
+    """
+    return canonical_assignment(assignment).tostring()
+
+
+class CompactSchedule(object):
+    """
+    A schedule stored as two small integer arrays: the shift of each event, and the event ids shift by shift in the
+    order they were added.  Copies are cheap, and the key is the same for every relabelling of the same shifts.
+    The full Schedule, with its shift objects and insertion cost vectors, is only rebuilt when it is needed.
+    """
+    __slots__ = ('conflict_table', 'assignment', 'order', 'num_shifts', 'conflict', 'key')
+
+    def __init__(self, conflict_table, assignment, order, num_shifts, conflict):
+        """
+        :param assignment: An array holding the shift index of each event, or -1 for events that are not scheduled
+        :param order: The scheduled event ids, shift by shift, each shift's events in the order they were added.
+               Rebuilt shifts list their events in the same order as the original.
+        :param conflict: The schedule's total conflict
+        """
+        self.conflict_table = conflict_table
+        self.assignment = np.asarray(assignment).astype(np.min_scalar_type(-num_shifts))
+        self.order = np.asarray(order, dtype=np.min_scalar_type(-len(self.assignment)))
+        self.num_shifts = num_shifts
+        self.conflict = conflict
+        self.key = assignment_key(self.assignment)
+
+    @classmethod
+    def from_schedule(cls, schedule):
+        order = [event_id for shift in schedule.shifts for event_id in shift.events]
+        return cls(schedule.conflict_table, schedule.assignment(), order, len(schedule.shifts), schedule.total_conflict())
+
+    def schedule(self):
+        """
+        :return: A new Schedule holding the same events in the same shifts
+        """
+        schedule = Schedule(self.conflict_table.roster, conflict_table=self.conflict_table, num_shifts=self.num_shifts)
+        for event_id in self.order:
+            schedule.shifts[self.assignment[event_id]].add_event(int(event_id))
+        return schedule
+
+
 class Shift(object):
     """
     An object that stores the events and event conflict info for a single Science Olympiad shift
+    Events are stored as their integer ids in the conflict table's roster
     """
     def __init__(self, conflict_table):
         self.events = []
@@ -69,45 +180,47 @@ class Shift(object):
         self.conf_table = conflict_table
         self.conflict_sum = 0
 
+        # insertion_costs[i] is the conflict score increase that would result from adding the event with table index i
+        self.insertion_costs = np.zeros(conflict_table.num_events)
+
     def num_events(self):
         """
         :return: the number of events in the shift
         """
         return len(self.events)
 
-    def add_event(self, event):
+    def add_event(self, event_id):
         """
         Add an event to the shift
         """
-        if event not in self.events:
-            # recalculate conflict info
-            cfsum = 0
-            for ev in self.events:
-                cf = self.conf_table.get_conflict_score(ev, event)
-                cfsum += cf
+        if event_id not in self.events:
+            # update conflict info
+            cfsum = self.insertion_costs[event_id]
+            self.insertion_costs += self.conf_table.symmetric_scores[event_id]
             self.conflict_sum += cfsum
-            self.events.append(event)
+            self.events.append(event_id)
             self.conflict_values.append(cfsum)
 
-    def remove_event(self, event):
+    def remove_event(self, event_id):
         """
         Remove a given event from the shift
         """
-        i = self.events.index(event)
-        event = self.events.pop(i)
+        i = self.events.index(event_id)
+        event_id = self.events.pop(i)
         conflict_value = self.conflict_values.pop(i)
         self.conflict_sum -= conflict_value
-        return event
+        if self.events:
+            self.insertion_costs -= self.conf_table.symmetric_scores[event_id]
+        else:
+            self.insertion_costs.fill(0)    # don't let floating point error build up in an empty shift
+            self.conflict_sum = 0
+        return event_id
 
-    def event_conflicts(self, event):
+    def event_conflicts(self, event_id):
         """
-        Get the conflict score increase that would result if the Event 'event' was added to this shift
+        Get the conflict score increase that would result if event 'event_id' was added to this shift
         """
-        cfsum = 0
-        for ev in self.events:
-            cf = self.conf_table.get_conflict_score(ev, event)
-            cfsum += cf
-        return cfsum
+        return self.insertion_costs[event_id]
 
     def calculate_conflict_sum(self):
         csum = 0
@@ -146,8 +259,9 @@ class Shift(object):
         """
         shift_copy = Shift(self.conf_table)
         shift_copy.events = copy.copy(self.events)      # make a shallow copy of the event list so that events themselves are not copied but list order will not be inadvertently changed
-        shift_copy.conflict_values = self.conflict_values
+        shift_copy.conflict_values = list(self.conflict_values)
         shift_copy.conflict_sum = self.conflict_sum
+        shift_copy.insertion_costs = self.insertion_costs.copy()
         return shift_copy
 
 
@@ -155,6 +269,8 @@ class Event(object):
     """
     An object that stores information on a single event
     """
+    __slots__ = ('id', 'name', 'kids', 'coach', 'hs', 'build_event')
+
     def __init__(self, name, kids=None, coach=None, hs=True):
         """
         :param name: Event name
@@ -163,20 +279,23 @@ class Event(object):
         :param hs: This value should be true if it's an HS event, false if it's a MS event.
                MS and HS events should NOT be combined into single events, it will result in a larger number of schedule conflicts.
         """
+        self.id = None      # dense integer id, assigned when the event is added to a Roster
         self.name = name
         self.kids = kids
         self.coach = coach
         self.hs = hs
-        self.build_event = (name in constants.BUILD_EVENTS)
-
-        # Set scheduling priority for this event
-        # Note: this may need to be adjusted by adding a parameter that covers whether the event has a MS or HS counterpart that it could be paired with
-        self.priority = constants.SIZE_FACTOR * len(self.kids) + constants.BUILD_EVENT_FACTOR * int(self.build_event)
+        self.build_event = (name in constants.BUILD_EVENTS)     # search priority comes from Roster.priorities
 
     def __eq__(self, other):
         # Check equality based on event name and whether it is HS or MS
         return isinstance(other, Event) and other.name == self.name and self.hs == other.hs
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, self.hs))
+
     def get_common_kids(self, other_event):
         """
         :param other_event: an Event object
@@ -0,0 +1,55 @@
+import numpy as np
+
+# Default memory budget for the working arrays of one chunk of score_assignments
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def score_assignments(conflict_table, assignments, num_shifts=None, chunk_size=None):
+    """
+    Score many candidate schedules at once, e.g. drafts made by hand or by another tool, without building Schedule objects.
+    Each candidate's per-shift conflict is a quadratic form x.T * M * x of the shift's 0/1 event vector x with an
+    upper-triangle pair matrix M, so a chunk of candidates is scored with one matrix product per pair matrix.
+    :param conflict_table: The ConflictTable of the roster the candidates schedule
+    :param assignments: An (N candidates x E events) integer array holding the shift index of each event, or -1 for
+           events that are not scheduled.  A memory-mapped array (np.load(..., mmap_mode='r')) is read one chunk at a time.
+    :param num_shifts: The number of shifts.  Defaults to one more than the highest shift index used.
+    :param chunk_size: Number of candidates scored per chunk.  Defaults to as many as fit in CHUNK_BYTES.
+    :return: A dict of arrays:
+             'conflict': (N,) total conflict of each candidate, as Schedule.total_conflict() would give
+             'shift_conflict': (N x shifts) conflict of each shift
+             'student_conflicts', 'coach_conflicts': (N x shifts) number of student and coach conflicts in each shift,
+             counted as in the exported schedules (a person in n events of a shift counts n*(n-1)/2 times)
+    """
+    assignments = np.asarray(assignments)
+    if assignments.ndim != 2 or assignments.shape[1] != conflict_table.num_events:
+        raise ValueError("assignments must be an (N x {}) array".format(conflict_table.num_events))
+    if assignments.size and assignments.min() < -1:
+        raise ValueError("shift indices must be -1 or higher")
+    if num_shifts is None:
+        num_shifts = int(assignments.max()) + 1 if assignments.size else 0
+    elif assignments.size and assignments.max() >= num_shifts:
+        raise ValueError("assignments use a shift index of {} or higher".format(num_shifts))
+
+    num_candidates, num_events = assignments.shape
+    if chunk_size is None:
+        # One-hot shift vectors plus one product per pair matrix, all (shifts x events) floats per candidate
+        chunk_size = max(1, CHUNK_BYTES // (4 * 8 * max(num_shifts, 1) * max(num_events, 1)))
+
+    kids, coaches = conflict_table.person_overlap_counts()
+    pair_matrices = [conflict_table.conflict_scores, kids, coaches]
+    results = [np.zeros([num_candidates, num_shifts]) for matrix in pair_matrices]
+
+    for start in range(0, num_candidates, chunk_size):
+        chunk = np.asarray(assignments[start:start + chunk_size], dtype=int)
+        rows, events = np.nonzero(chunk >= 0)
+        in_shift = np.zeros([len(chunk), num_shifts, num_events])
+        in_shift[rows, chunk[rows, events], events] = 1
+        in_shift = in_shift.reshape(len(chunk) * num_shifts, num_events)
+        for matrix, result in zip(pair_matrices, results):
+            result[start:start + len(chunk)] = (in_shift.dot(matrix) * in_shift).sum(axis=1).reshape(len(chunk), num_shifts)
+
+    shift_conflict, student_conflicts, coach_conflicts = results
+    return {'conflict': shift_conflict.sum(axis=1),
+            'shift_conflict': shift_conflict,
+            'student_conflicts': student_conflicts.round().astype(int),
+            'coach_conflicts': coach_conflicts.round().astype(int)}
@@ -0,0 +1,84 @@
+import multiprocessing
+from optimization import ConflictSearch, RemainingConflictBound, TIE_TOLERANCE, warm_start
+from parallel import SharedScheduleGroup
+from schedule_components import Schedule, CompactSchedule
+from instrumentation import SearchStats
+from worker_pool import pool_map
+
+
+def _search_shift_count(index, conflict_table, shift_counts, upper_bounds, search_options):
+    """
+    Search for the best schedule with shift_counts[index] shifts, pruning with the best conflict of the smaller counts
+    :return: (index, assignment, order, conflict, search_complete, nodes), with None for the schedule fields if no
+             schedule beat the bound from a smaller count
+    """
+    schedule = Schedule(conflict_table.roster, conflict_table=conflict_table, num_shifts=shift_counts[index])
+    best_groupings = SharedScheduleGroup(upper_bounds, index, max_size=1)
+    warm_start(schedule, best_groupings, attempts=8)
+    stats = SearchStats()
+    ConflictSearch(schedule, best_groupings, RemainingConflictBound(schedule), stats=stats, **search_options).run()
+
+    compacts = best_groupings.compact_list()
+    if not compacts:
+        return index, None, None, None, best_groupings.search_complete, stats.nodes
+    return (index, compacts[0].assignment, compacts[0].order, compacts[0].conflict, best_groupings.search_complete,
+            stats.nodes)
+
+
+def minimum_shift_search(conflict_table, shift_counts=range(1, 9), target_conflict=0, processes=None, **search_options):
+    """
+    Find the best conflict for each of several shift counts, searched concurrently with one exact search per count.
+    All searches share the conflict table, and the best conflict found at a count prunes the searches of larger counts
+    (see SharedScheduleGroup).
+    Each count keeps only its best schedule, so its search prunes like minimize_conflict with num_results=1.
+    :param conflict_table: The ConflictTable of the roster to schedule
+    :param shift_counts: The numbers of shifts to try
+    :param target_conflict: The highest acceptable conflict.  The result marks the counts that reach it.
+    :param processes: Number of worker processes.  Defaults to one per shift count, up to the number of CPUs.
+    :param search_options: Passed on to each ConflictSearch, e.g. time_limit or max_nodes
+    :return: A list with a dict per shift count, fewest shifts first:
+             'shifts', 'conflict' (best conflict found), 'schedule' (a Schedule with that conflict), 'search_complete',
+             'nodes', 'pareto' (True if it has less conflict than every smaller count) and 'acceptable' (True if its
+             conflict is at or below target_conflict).  A count's best schedule can come from a smaller count, with
+             the extra shifts left empty.
+    """
+    shift_counts = sorted(set(shift_counts))
+    upper_bounds = multiprocessing.Array('d', [float('inf')] * len(shift_counts))
+
+    searched = list(pool_map(_search_shift_count, range(len(shift_counts)),
+                             (conflict_table, shift_counts, upper_bounds, search_options), processes,
+                             ordered=False))
+
+    rows = []
+    best = None     # (conflict, assignment, order) of the best schedule at this or any smaller count
+    for index, assignment, order, conflict, search_complete, nodes in sorted(searched, key=lambda result: result[0]):
+        if conflict is not None and (best is None or conflict < best[0] - TIE_TOLERANCE):
+            best = (conflict, assignment, order)
+            pareto = True
+        else:
+            pareto = False
+        compact = CompactSchedule(conflict_table, best[1], best[2], shift_counts[index], best[0]) if best else None
+        rows.append({'shifts': shift_counts[index],
+                     'conflict': best[0] if best else None,
+                     'schedule': compact.schedule() if compact else None,
+                     'search_complete': search_complete,
+                     'nodes': nodes,
+                     'pareto': pareto,
+                     'acceptable': best is not None and best[0] <= target_conflict + TIE_TOLERANCE})
+    return rows
+
+
+def print_shift_table(rows):
+    """
+    Print the results of minimum_shift_search, and the fewest shifts that reach the target conflict
+    """
+    print "{:>6}  {:>9}  {:>8}  {:>6}  {:>10}".format('shifts', 'conflict', 'complete', 'pareto', 'nodes')
+    for row in rows:
+        conflict = '{:.3f}'.format(row['conflict']) if row['conflict'] is not None else '-'
+        print "{:>6}  {:>9}  {:>8}  {:>6}  {:>10}".format(row['shifts'], conflict, str(row['search_complete']),
+                                                          str(row['pareto']), row['nodes'])
+    acceptable = [row['shifts'] for row in rows if row['acceptable']]
+    if acceptable:
+        print "Fewest shifts with acceptable conflict: {}".format(acceptable[0])
+    else:
+        print "No shift count reached the target conflict."
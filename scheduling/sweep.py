@@ -0,0 +1,108 @@
+import numpy as np
+import constants
+from optimization import ScheduleGroup, minimize_conflict
+from schedule_components import Schedule, CompactSchedule
+from instrumentation import SearchStats
+from scoring import score_assignments
+from worker_pool import pool_map
+from weights import Weights
+
+
+def pair_changes(assignment, other):
+    """
+    :return: The number of event pairs that are in the same shift in one assignment but not in the other.  This is 0
+             for two assignments that only differ in shift labels.
+    """
+    together = assignment[:, None] == assignment[None, :]
+    other_together = other[:, None] == other[None, :]
+    return int(np.triu(together != other_together, 1).sum())
+
+
+def _search_weighting(weights, schedule, num_results, search_options):
+    """
+    Search one weighting of the schedule's conflict table
+    :return: (list of (assignment, order, conflict) for the schedules kept, search_complete, nodes)
+    """
+    table = schedule.conflict_table.reweighted(weights)
+    weighted = Schedule(table.roster, conflict_table=table, num_shifts=len(schedule.shifts))
+    weighted.add_assignment(schedule.assignment())
+    stats = SearchStats()
+    best_groupings = minimize_conflict(weighted, num_results=num_results, stats=stats, **search_options)
+    results = [(compact.assignment, compact.order, compact.conflict) for compact in best_groupings.compact_list()]
+    return results, best_groupings.search_complete, stats.nodes
+
+
+def sweep_weights(schedule, weightings, num_results=constants.NUM_SCHEDULE_OPTIONS, processes=None, baseline=None,
+                  **search_options):
+    """
+    Find the best schedules under each of several weightings, e.g. from weight_grid, and compare them.
+    The conflict table is built once; each weighting re-weights its component matrices (see ConflictTable.reweighted).
+    Weightings are searched in parallel, one exact search (minimize_conflict) per weighting.
+    :param schedule: A (partially filled) schedule.  Its conflict table's component matrices are shared by every weighting.
+    :param weightings: A list of Weights
+    :param num_results: The number of schedule options to keep per weighting
+    :param processes: Number of worker processes.  Defaults to one per weighting, up to the number of CPUs.
+    :param baseline: The Weights the others are compared with.  Defaults to Weights(), the factors in the constants
+           file.  If it isn't one of the weightings, it is searched too and added at the end of the result.
+    :param search_options: Passed on to minimize_conflict, e.g. time_limit or max_nodes
+    :return: A list with a dict per weighting, in order:
+             'weights', 'baseline' (True for the baseline weighting), 'best_groupings' (a ScheduleGroup on the re-weighted table), 'search_complete', 'nodes',
+             'conflict' (best conflict under its own weights), 'baseline_conflict' (the same schedule scored under the
+             baseline weights), 'student_conflicts' and 'coach_conflicts' (totals for the best schedule), and
+             'pairs_changed' (event pairs grouped differently from the baseline's best schedule, see pair_changes)
+    """
+    baseline = baseline or Weights()
+    weightings = list(weightings)
+    if baseline not in weightings:
+        weightings.append(baseline)
+    baseline_index = weightings.index(baseline)
+
+    schedule.sort_shifts()
+    searched = list(pool_map(_search_weighting, weightings, (schedule, num_results, search_options), processes))
+
+    baseline_table = schedule.conflict_table.reweighted(baseline)
+    sweep = []
+    for weights, (results, search_complete, nodes) in zip(weightings, searched):
+        table = schedule.conflict_table.reweighted(weights)
+        best_groupings = ScheduleGroup(max_size=num_results)
+        for assignment, order, conflict in results:
+            best_groupings.put(CompactSchedule(table, assignment, order, len(schedule.shifts), conflict))
+        best_groupings.search_complete = search_complete
+        sweep.append({'weights': weights, 'baseline': weights == baseline, 'best_groupings': best_groupings, 'search_complete': search_complete,
+                      'nodes': nodes, 'conflict': results[0][2] if results else None})
+
+    # Score every weighting's best schedule under the baseline weights, in one batch
+    best = [entry['best_groupings'].compact_list() for entry in sweep]
+    best_assignments = np.array([compacts[0].assignment for compacts in best if compacts], dtype=int)
+    scores = score_assignments(baseline_table, best_assignments.reshape(-1, baseline_table.num_events), len(schedule.shifts))
+    baseline_best = best[baseline_index][0].assignment if best[baseline_index] else None
+    index = 0
+    for entry, compacts in zip(sweep, best):
+        if not compacts:
+            entry.update({'baseline_conflict': None, 'student_conflicts': None, 'coach_conflicts': None, 'pairs_changed': None})
+            continue
+        entry.update({'baseline_conflict': scores['conflict'][index],
+                      'student_conflicts': int(scores['student_conflicts'][index].sum()),
+                      'coach_conflicts': int(scores['coach_conflicts'][index].sum()),
+                      'pairs_changed': pair_changes(best_assignments[index], baseline_best)
+                      if baseline_best is not None else None})
+        index += 1
+    return sweep
+
+
+def print_sweep(sweep):
+    """
+    Print a table of the results of sweep_weights, one line per weighting.  The baseline's line is marked with a *.
+    """
+    varied = [field for field in sweep[0]['weights'].FIELDS
+              if len(set(getattr(entry['weights'], field) for entry in sweep)) > 1]
+    names = [field.replace('_factor', '') for field in varied]
+    print '  '.join(['{:>14}'.format(name) for name in names] +
+                    ['{:>9}'.format(column) for column in ('conflict', 'baseline', 'students', 'coaches', 'changed', 'complete')])
+    for entry in sweep:
+        values = [getattr(entry['weights'], field) for field in varied]
+        columns = [entry['conflict'], entry['baseline_conflict'], entry['student_conflicts'], entry['coach_conflicts'],
+                   entry['pairs_changed'], entry['search_complete']]
+        print '  '.join(['{:>14}'.format(value) for value in values] +
+                        ['{:>9.3f}'.format(value) if isinstance(value, float) else '{:>9}'.format(str(value))
+                         for value in columns] + ['*' if entry['baseline'] else ''])
@@ -0,0 +1,56 @@
+import numpy as np
+from file_io import events_from_dicts
+
+
+def synthetic_event_dicts(num_events, kids_per_event=3, overlap=0.5, hs_fraction=0.5, coach_reuse=0.5, seed=0):
+    """
+    Generate a random roster in the same format as the JSON input files
+    :param num_events: Total number of events
+    :param kids_per_event: Average number of kids in an event.  Event sizes vary by one either way.
+    :param overlap: Probability that each spot in an event goes to a kid who is already in another event of the same
+           division, instead of a new kid.  Higher values give denser conflict graphs.
+    :param hs_fraction: Fraction of events that are HS (C) events.  B and C events with the same name get the simultaneity bonus.
+    :param coach_reuse: Probability that an event's coach already coaches another event, instead of being a new coach
+    :param seed: Random seed.  The same arguments always give the same roster.
+    :return: A list of event info dicts
+    """
+    rng = np.random.RandomState(seed)
+    num_hs = int(round(num_events * hs_fraction))
+    divisions = [(True, num_hs), (False, num_events - num_hs)]
+
+    event_dicts = []
+    coaches = []
+    for hs, count in divisions:
+        prefix = 'C' if hs else 'B'
+        kids = []       # kids in this division; MS and HS kids never overlap
+        for index in range(count):
+            size = max(1, kids_per_event + rng.randint(-1, 2))
+            members = []
+            while len(members) < size:
+                available = [kid for kid in kids if kid not in members]
+                if available and rng.rand() < overlap:
+                    members.append(available[rng.randint(len(available))])
+                else:
+                    kids.append('{} Kid {}'.format(prefix, len(kids)))
+                    members.append(kids[-1])
+
+            if coaches and rng.rand() < coach_reuse:
+                coach = coaches[rng.randint(len(coaches))]
+            else:
+                coach = 'Coach {}'.format(len(coaches))
+                coaches.append(coach)
+
+            event_dicts.append({'name': 'Event {}'.format(index),      # B and C events share names, as in the real input
+                                'hs': hs,
+                                'coach': coach,
+                                'build_event': False,
+                                'kids': members})
+    return event_dicts
+
+
+def synthetic_events(num_events, **options):
+    """
+    :param options: See synthetic_event_dicts
+    :return: A list of Event objects for a random roster
+    """
+    return events_from_dicts(synthetic_event_dicts(num_events, **options))
@@ -0,0 +1,60 @@
+import itertools
+import constants
+
+
+class Weights(object):
+    """
+    The factors that turn conflict counts and event sizes into scores, as a runtime setting.
+    Any factor that isn't given is read from the constants module when the object is created, so the defaults match
+    constants.py.  A ConflictTable can be re-weighted cheaply (see ConflictTable.reweighted), so several weightings can
+    be compared without rebuilding the table or editing constants.py.
+    """
+    FIELDS = ('kid_conflict_factor', 'coach_conflict_factor', 'simultaneity_bonus', 'size_factor', 'build_event_factor')
+
+    def __init__(self, kid_conflict_factor=None, coach_conflict_factor=None, simultaneity_bonus=None, size_factor=None,
+                 build_event_factor=None):
+        """
+        :param kid_conflict_factor: Multiplies kid conflicts.  Defaults to constants.KID_CONFLICT_FACTOR.
+        :param coach_conflict_factor: Multiplies coach conflicts.  Defaults to constants.COACH_CONFLICT_FACTOR.
+        :param simultaneity_bonus: Score for a B/C pair in the same shift.  Defaults to constants.SIMULTENAITY_BONUS.
+        :param size_factor: Search priority per kid in an event.  Defaults to constants.SIZE_FACTOR.
+        :param build_event_factor: Search priority bonus for build events.  Defaults to constants.BUILD_EVENT_FACTOR.
+        """
+        defaults = (constants.KID_CONFLICT_FACTOR, constants.COACH_CONFLICT_FACTOR, constants.SIMULTENAITY_BONUS,
+                    constants.SIZE_FACTOR, constants.BUILD_EVENT_FACTOR)
+        values = (kid_conflict_factor, coach_conflict_factor, simultaneity_bonus, size_factor, build_event_factor)
+        for field, value, default in zip(self.FIELDS, values, defaults):
+            setattr(self, field, default if value is None else value)
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    def replace(self, **changes):
+        """
+        :return: A copy of these weights with some factors changed
+        """
+        values = self.as_dict()
+        values.update(changes)
+        return Weights(**values)
+
+    def __eq__(self, other):
+        return isinstance(other, Weights) and self.as_dict() == other.as_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Weights({})'.format(', '.join('{}={!r}'.format(field, getattr(self, field)) for field in self.FIELDS))
+
+
+def weight_grid(base=None, **values):
+    """
+    Build every combination of the given factor values, e.g. weight_grid(kid_conflict_factor=[1, 2], simultaneity_bonus=[-0.25, -1])
+    :param base: Weights for the factors that aren't varied.  Defaults to Weights().
+    :param values: A list of values for each factor to vary (see Weights.FIELDS)
+    :return: A list of Weights
+    """
+    base = base or Weights()
+    fields = sorted(values)
+    return [base.replace(**dict(zip(fields, combination)))
+            for combination in itertools.product(*[values[field] for field in fields])]
@@ -0,0 +1,45 @@
+import multiprocessing
+
+# State inherited by each pool worker, set by _init_worker: the function to call and the arguments shared by every call
+_worker = {}
+
+
+def _init_worker(function, shared_args):
+    _worker['function'] = function
+    _worker['shared_args'] = shared_args
+
+
+def _call_worker(item):
+    return _worker['function'](item, *_worker['shared_args'])
+
+
+def pool_map(function, items, shared_args=(), processes=None, ordered=True):
+    """
+    Generator that calls function(item, *shared_args) for each item, on a process pool if processes > 1 and otherwise
+    in this process.  shared_args are sent to each worker once, when it starts, so they can be large or hold shared
+    multiprocessing values.
+    :param function: A module-level function, so that workers can find it
+    :param items: The items to call it on
+    :param shared_args: A tuple of further arguments for every call
+    :param processes: Number of worker processes.  Defaults to one per item, up to the number of CPUs.
+    :param ordered: If False, results come back in the order they finish rather than in item order
+    :return: A generator of the results
+    """
+    items = list(items)
+    if processes is None:
+        processes = min(len(items), multiprocessing.cpu_count())
+    if processes <= 1:
+        for item in items:
+            yield function(item, *shared_args)
+        return
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(function, shared_args))
+    try:
+        for result in (pool.imap if ordered else pool.imap_unordered)(_call_worker, items):
+            yield result
+    except BaseException:       # a worker raised, or the caller stopped early: don't wait for the tasks still queued
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
@@ -0,0 +1,42 @@
+"""
+Compare the best schedules for a roster under several weightings.
+
+Example:
+    python weight_sweep.py input/sample_event_info.json --kid-conflict-factor 1 2 --simultaneity-bonus -0.25 -1
+Every combination of the given values is searched, in parallel.  Factors that aren't given keep their values from
+scheduling/constants.py.  The baseline is the weighting from constants.py; it is searched too if it isn't in the grid,
+and its line is marked with a *.  For each weighting the table shows the best conflict, that schedule's conflict under
+the baseline weights, its student and coach conflicts, and how many event
+pairs it groups differently from the baseline's best schedule.
+"""
+import argparse
+import os
+import scheduling
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('roster', help='roster file (.json, .txt or .csv)')
+    for field in scheduling.Weights.FIELDS:
+        parser.add_argument('--' + field.replace('_', '-'), type=float, nargs='+', dest=field, metavar='VALUE')
+    parser.add_argument('--num-results', type=int, default=scheduling.constants.NUM_SCHEDULE_OPTIONS)
+    parser.add_argument('--num-shifts', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=None, help='number of weightings searched at once (default: CPUs)')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds of search per weighting')
+    parser.add_argument('--output-dir', default=None, help='if given, save the best schedules of each weighting here')
+    args = parser.parse_args()
+
+    values = dict((field, getattr(args, field)) for field in scheduling.Weights.FIELDS if getattr(args, field))
+    weightings = scheduling.weight_grid(**values)
+    table = scheduling.ConflictTable(scheduling.load_events(args.roster))
+    schedule = scheduling.Schedule(table.roster, conflict_table=table, num_shifts=args.num_shifts)
+    print "Searching {} weightings{}".format(len(weightings), '' if scheduling.Weights() in weightings else ' and the baseline')
+    sweep = scheduling.sweep_weights(schedule, weightings, num_results=args.num_results, processes=args.processes,
+                                     time_limit=args.time_limit)
+    scheduling.print_sweep(sweep)
+
+    if args.output_dir is not None:
+        if not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+        for number, entry in enumerate(sweep):
+            entry['best_groupings'].results().save('weighting{}'.format(number), args.output_dir)